@@ -1,8 +1,116 @@
-from django.contrib import admin
-from .models import Category, Product, Sale
+import csv
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import F, Max, Min, Sum
+from django.db.models.functions import Greatest
+from django.http import StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from django.utils.functional import cached_property
+from .forecasting import invalidate_reorder_suggestions
+from .jobs import enqueue
+from .reports import invalidate_category_stats
+from .models import Category, Product, Sale, StockMovement, StockReservation
+from .tasks import LOW_STOCK_DIGEST
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that avoids a full COUNT(*) on large tables."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = getattr(settings, 'ADMIN_COUNT_LIMIT', 10000)
+
+        if not queryset.query.has_filters():
+            # Unfiltered changelists: the table size from statistics or the primary key
+            estimate = self.estimate_table_size(queryset)
+            if estimate > limit:
+                return estimate
+
+        # Filtered changelists count at most limit rows
+        return queryset.order_by()[:limit].count()
+
+    def estimate_table_size(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] > 0:
+                return row[0]
+        # Two index lookups; only rows deleted between the lowest and highest id are overcounted
+        bounds = queryset.order_by().aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['high'] is None:
+            return 0
+        return bounds['high'] - bounds['low'] + 1
+
+
+class ScalableModelAdmin(admin.ModelAdmin):
+    # Shared changelist settings for tables that grow to hundreds of thousands of rows
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+def export_as_csv(fields, filename):
+    # Builds an admin action that streams the selected rows as CSV
+
+    class Echo:
+        def write(self, value):
+            return value
+
+    def export(modeladmin, request, queryset):
+        writer = csv.writer(Echo())
+        rows = queryset.order_by('pk').values_list(*fields).iterator(chunk_size=2000)
+        response = StreamingHttpResponse(
+            (writer.writerow(row) for row in _with_header(fields, rows)),
+            content_type='text/csv',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    export.short_description = 'Export selected rows as CSV'
+    return export
+
+
+def _with_header(header, rows):
+    yield header
+    yield from rows
+
+
+class StockAdjustmentForm(forms.Form):
+
+    mode = forms.ChoiceField(choices=[('add', 'Add to current stock'), ('set', 'Set stock to')])
+    quantity = forms.IntegerField(help_text='Use a negative number with "add" to remove stock.')
+
+
+class LowStockFilter(admin.SimpleListFilter):
+
+    title = 'low stock'
+    parameter_name = 'is_low_stock'
+
+    def lookups(self, request, model_admin):
+        return (('yes', 'Yes'), ('no', 'No'))
+
+    def queryset(self, request, queryset):
+        threshold = getattr(settings, 'STOCK_THRESHOLD', 5)
+        if self.value() == 'yes':
+            return queryset.filter(quantity__lte=threshold)
+        if self.value() == 'no':
+            return queryset.filter(quantity__gt=threshold)
+        return queryset
+
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(ScalableModelAdmin):
     """Admin configuration for Category model."""
     
     list_display = ('name', 'description', 'created_at', 'updated_at')
@@ -10,19 +118,122 @@ class CategoryAdmin(admin.ModelAdmin):
     list_filter = ('created_at',)
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(ScalableModelAdmin):
     """Admin configuration for Product model."""
     
     list_display = ('name', 'category', 'price', 'quantity', 'is_low_stock', 'created_at')
-    list_filter = ('category', 'created_at')
+    list_select_related = ('category',)
+    list_filter = (LowStockFilter, ('category', admin.RelatedOnlyFieldListFilter), 'created_at')
     search_fields = ('name', 'description', 'category__name')
     readonly_fields = ('is_low_stock',)
+    autocomplete_fields = ('category',)
+    actions = [
+        'adjust_stock',
+        export_as_csv(
+            ['id', 'name', 'category__name', 'price', 'quantity', 'created_at', 'updated_at'],
+            'products.csv',
+        ),
+    ]
+
+    @admin.display(boolean=True, ordering='quantity')
+    def is_low_stock(self, obj):
+        return obj.is_low_stock
+
+    @admin.action(description='Adjust stock of selected products')
+    def adjust_stock(self, request, queryset):
+        form = StockAdjustmentForm(request.POST if 'apply' in request.POST else None)
+
+        if form.is_valid():
+            quantity = form.cleaned_data['quantity']
+            adding = form.cleaned_data['mode'] == 'add'
+            if adding:
+                new_quantity = Greatest(F('quantity') + quantity, 0)
+            else:
+                new_quantity = max(quantity, 0)
+            now = timezone.now()
+            with transaction.atomic():
+                # Locked and read first so each stock movement records what the UPDATE changed
+                before = list(queryset.select_for_update().values_list('id', 'quantity').iterator(chunk_size=5000))
+                afters = {
+                    product_id: max(old + quantity, 0) if adding else new_quantity
+                    for product_id, old in before
+                }
+                # Held units must stay on hand, or confirming those holds would fail
+                reserved = (
+                    StockReservation.objects.active()
+                    .filter(product__in=queryset.values('pk'))
+                    .order_by()
+                    .values('product')
+                    .annotate(units=Sum('quantity'))
+                    .values_list('product', 'units')
+                )
+                short = [product_id for product_id, units in reserved if afters.get(product_id, units) < units]
+                if short:
+                    names = Product.objects.filter(id__in=short[:5]).order_by('name').values_list('name', flat=True)
+                    self.message_user(
+                        request,
+                        f"Stock was not adjusted: {len(short)} products would have less stock than "
+                        f"their active reservations hold ({', '.join(names)}{', ...' if len(short) > 5 else ''}).",
+                        messages.ERROR,
+                    )
+                    return None
+                # One UPDATE; updated_at is set by hand because save() and its signals are skipped
+                updated = queryset.update(quantity=new_quantity, updated_at=now)
+                movements = []
+                for product_id, old in before:
+                    after = afters[product_id]
+                    if after != old:
+                        movements.append(StockMovement(
+                            product_id=product_id, quantity_change=after - old, quantity_after=after,
+                            reason=StockMovement.Reason.ADJUSTMENT, created_at=now,
+                        ))
+                StockMovement.objects.bulk_create(movements, batch_size=5000)
+            invalidate_reorder_suggestions()
+            invalidate_category_stats()
+            if queryset.filter(quantity__lte=getattr(settings, 'STOCK_THRESHOLD', 5)).exists():
+                enqueue(
+                    LOW_STOCK_DIGEST,
+                    dedup_key=LOW_STOCK_DIGEST,
+                    delay=getattr(settings, 'LOW_STOCK_DIGEST_DELAY', 300),
+                )
+            self.message_user(request, f"Adjusted stock of {updated} products.", messages.SUCCESS)
+            return None
+
+        select_across = request.POST.get('select_across') == '1'
+        return TemplateResponse(request, 'admin/api/product/adjust_stock.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Adjust stock',
+            'opts': self.model._meta,
+            'form': form,
+            'select_across': select_across,
+            # With "select all" the changelist filters pick the rows, not the ids
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME)[:1 if select_across else None],
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
 
 @admin.register(Sale)
-class SaleAdmin(admin.ModelAdmin):
+class SaleAdmin(ScalableModelAdmin):
     """Admin configuration for Sale model."""
     
-    list_display = ('product', 'quantity', 'unit_price', 'total_price', 'sale_date', 'created_by')
-    list_filter = ('sale_date', 'product', 'created_by')
-    search_fields = ('product__name', 'created_by__username')
-    readonly_fields = ('total_price',)
\ No newline at end of file
+    # Snapshot columns, so the changelist and exports read only the sales table
+    list_display = ('product_name', 'quantity', 'unit_price', 'total_price', 'sale_date', 'created_by_username')
+    # Product and seller are searched rather than listed in the sidebar
+    list_filter = ('sale_date',)
+    search_fields = ('product_name', 'created_by_username')
+    readonly_fields = ('product_name', 'category', 'total_price', 'created_by_username')
+    autocomplete_fields = ('product', 'created_by')
+    actions = [
+        export_as_csv(
+            ['id', 'product_id', 'product_name', 'category_id', 'quantity', 'unit_price',
+             'total_price', 'sale_date', 'created_by_id', 'created_by_username'],
+            'sales.csv',
+        ),
+    ]
+
+@admin.register(StockReservation)
+class StockReservationAdmin(ScalableModelAdmin):
+    """Admin configuration for StockReservation model."""
+    
+    list_display = ('product', 'quantity', 'created_by', 'created_at', 'expires_at')
+    list_select_related = ('product', 'created_by')
+    raw_id_fields = ('product', 'created_by')
@@ -0,0 +1,298 @@
+"""
+In-process prefix index for product name autocomplete.
+
+Names are normalized (case-folded, accents stripped, punctuation collapsed to
+single spaces) and every word start is indexed, so "ham" finds both "Hammer"
+and "Claw Hammer". Display and normalized names are packed into two bytes
+blobs, and the index itself is an ``array`` of offsets of word starts in the
+normalized blob, sorted with NumPy by the ``KEY_BYTES`` that follow each
+offset. A lookup is a binary search plus a short scan, and no Python object
+is kept per product or per word.
+
+Changes go to a small sorted overlay while the packed entries they replace
+are masked by id; the overlay is merged back once it reaches
+``MERGE_THRESHOLD`` entries. Product signals update the index of the process
+that made the change after the transaction commits. Every other worker
+re-reads products and product tombstones changed since its last refresh,
+at most every ``AUTOCOMPLETE_REFRESH_SECONDS``. The request that finds the
+index missing or due for a refresh does the database reads without holding
+any lock that lookups wait on; requests arriving meanwhile are answered from
+the previous index, or with no suggestions before the first build. NumPy is
+only imported when the index is first built.
+"""
+
+import bisect
+import heapq
+import re
+import threading
+import unicodedata
+from array import array
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Product, Tombstone
+
+KEY_BYTES = 16
+MERGE_THRESHOLD = 10000
+# Re-reading a little history covers transactions that committed after their updated_at was set
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+
+def normalize(text):
+    text = text.casefold()
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(re.findall(r'\w+', text))
+
+
+def index_keys(normalized):
+    # The normalized name from each word start on
+    if not normalized:
+        return []
+    keys = [normalized.encode()]
+    start = normalized.find(' ') + 1
+    while start:
+        keys.append(normalized[start:].encode())
+        start = normalized.find(' ', start) + 1
+    return keys
+
+
+class PackedStrings:
+    # Byte strings stored back to back in one blob, each followed by a newline
+
+    def __init__(self, values):
+        import numpy as np
+
+        self.blob = b''.join(value + b'\n' for value in values)
+        ends = np.flatnonzero(np.frombuffer(self.blob, np.uint8) == ord('\n')) + 1
+        self.offsets = array('I', [0])
+        self.offsets.frombytes(ends.astype(np.uint32).tobytes())
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i + 1] - 1]
+
+    def nbytes(self):
+        return len(self.blob) + self.offsets.itemsize * len(self.offsets)
+
+
+class PrefixIndex:
+
+    def __init__(self, products=()):
+        # products: (id, name) pairs in ascending id order
+        self.lock = threading.RLock()
+        self.synced_at = None
+        self.pack((product_id, name.encode(), normalize(name).encode()) for product_id, name in products)
+
+    def pack(self, rows):
+        # rows: (id, name, normalized name) as bytes, in ascending id order
+        import numpy as np
+
+        name_ids = array('q')
+        names = []
+        normalized = []
+        for product_id, name, normalized_name in rows:
+            name_ids.append(product_id)
+            names.append(name.replace(b'\n', b' '))
+            normalized.append(normalized_name)
+        self.name_ids = name_ids
+        self.names = PackedStrings(names)
+        self.normalized = PackedStrings(normalized)
+
+        # Word starts: the start of every name plus every byte after a space
+        data = np.frombuffer(self.normalized.blob, np.uint8)
+        starts = np.frombuffer(self.normalized.offsets, np.uint32)[:-1].astype(np.int64)
+        starts = starts[data[starts] != ord('\n')] if len(data) else starts
+        positions = np.sort(np.concatenate([starts, np.flatnonzero(data == ord(' ')) + 1]))
+        # Sorting on fixed-width keys; bytes past the end of the blob read as empty
+        padded = np.concatenate([data, np.zeros(KEY_BYTES, np.uint8)])
+        keys = np.empty((len(positions), KEY_BYTES), np.uint8)
+        for column in range(KEY_BYTES):
+            keys[:, column] = padded[positions + column]
+        keys = keys.view(f'S{KEY_BYTES}').ravel()
+        self.positions = array('I')
+        self.positions.frombytes(positions[np.argsort(keys, kind='stable')].astype(np.uint32).tobytes())
+
+        self.overlay = []
+        self.overlay_names = {}
+        self.masked = set()
+
+    def sort_key(self, position):
+        return self.normalized.blob[position:position + KEY_BYTES]
+
+    def __len__(self):
+        with self.lock:
+            return len(self.name_ids) - len(self.masked) + len(self.overlay_names)
+
+    def nbytes(self):
+        # Size of the packed arrays, excluding the overlay
+        return (
+            self.names.nbytes() + self.normalized.nbytes()
+            + self.positions.itemsize * len(self.positions)
+            + self.name_ids.itemsize * len(self.name_ids)
+        )
+
+    def packed_position(self, product_id):
+        i = bisect.bisect_left(self.name_ids, product_id)
+        if i < len(self.name_ids) and self.name_ids[i] == product_id:
+            return i
+        return None
+
+    def name(self, product_id):
+        if product_id in self.overlay_names:
+            return self.overlay_names[product_id]
+        if product_id in self.masked:
+            return None
+        i = self.packed_position(product_id)
+        return None if i is None else self.names[i].decode()
+
+    def search(self, query, limit=10):
+        query = normalize(query).encode()
+        if not query or limit < 1:
+            return []
+
+        results = []
+        seen = set()
+        with self.lock:
+            for _, product_id in heapq.merge(self.packed_matches(query), self.overlay_matches(query)):
+                if product_id in seen:
+                    continue
+                seen.add(product_id)
+                results.append({'id': product_id, 'name': self.name(product_id)})
+                if len(results) >= limit:
+                    break
+        return results
+
+    def packed_matches(self, query):
+        blob = self.normalized.blob
+        prefix = query[:KEY_BYTES]
+        i = bisect.bisect_left(self.positions, prefix, key=self.sort_key)
+        while i < len(self.positions):
+            position = self.positions[i]
+            if not blob.startswith(prefix, position):
+                return
+            # Keys are only sorted on their first KEY_BYTES, so longer queries are checked in full
+            if blob.startswith(query, position):
+                product_id = self.name_ids[bisect.bisect_right(self.normalized.offsets, position) - 1]
+                if product_id not in self.masked:
+                    yield blob[position:blob.index(b'\n', position)], product_id
+            i += 1
+
+    def overlay_matches(self, query):
+        i = bisect.bisect_left(self.overlay, (query,))
+        while i < len(self.overlay) and self.overlay[i][0].startswith(query):
+            yield self.overlay[i]
+            i += 1
+
+    def add(self, product_id, name):
+        with self.lock:
+            if self.name(product_id) == name:
+                return
+            self.discard(product_id)
+            self.overlay_names[product_id] = name
+            for key in index_keys(normalize(name)):
+                bisect.insort(self.overlay, (key, product_id))
+            if len(self.overlay) >= MERGE_THRESHOLD:
+                self.merge()
+
+    def remove(self, product_id):
+        with self.lock:
+            self.discard(product_id)
+
+    def discard(self, product_id):
+        old_name = self.overlay_names.pop(product_id, None)
+        if old_name is not None:
+            for key in index_keys(normalize(old_name)):
+                i = bisect.bisect_left(self.overlay, (key, product_id))
+                del self.overlay[i]
+        if self.packed_position(product_id) is not None:
+            self.masked.add(product_id)
+
+    def merge(self):
+        # Repacking with the overlay folded in; only overlay names are normalized again
+        packed = (
+            (product_id, self.names[i], self.normalized[i])
+            for i, product_id in enumerate(self.name_ids)
+            if product_id not in self.masked
+        )
+        changed = (
+            (product_id, name.encode(), normalize(name).encode())
+            for product_id, name in sorted(self.overlay_names.items())
+        )
+        self.pack(heapq.merge(packed, changed))
+
+    def refresh(self):
+        # Applying changes other processes made since the last refresh
+        started = timezone.now()
+        since = self.synced_at - REFRESH_OVERLAP
+        # Read before taking the lock, so lookups only wait for the in-memory updates
+        changed = list(Product.objects.filter(updated_at__gte=since).values_list('id', 'name'))
+        deleted = list(Tombstone.objects.filter(
+            model_name=Product._meta.model_name, deleted_at__gte=since
+        ).values_list('object_id', flat=True))
+        with self.lock:
+            for product_id, name in changed:
+                self.add(product_id, name)
+            for product_id in deleted:
+                self.remove(product_id)
+            self.synced_at = started
+
+
+_index = None
+# Held by the one request building or refreshing the index; lookups never wait for it
+_build_lock = threading.Lock()
+
+
+def get_index():
+    # Built on first use, then refreshed from the database at most every AUTOCOMPLETE_REFRESH_SECONDS.
+    # Returns None while the first build is still running in another request.
+    global _index
+    index = _index
+    interval = timedelta(seconds=getattr(settings, 'AUTOCOMPLETE_REFRESH_SECONDS', 30))
+    if index is not None and timezone.now() - index.synced_at < interval:
+        return index
+    if not _build_lock.acquire(blocking=False):
+        return index
+    try:
+        if _index is None:
+            started = timezone.now()
+            index = PrefixIndex(
+                Product.objects.order_by('id').values_list('id', 'name').iterator(chunk_size=10000)
+            )
+            index.synced_at = started
+            # Readers pick up the finished index with one reference swap
+            _index = index
+        elif timezone.now() - _index.synced_at >= interval:
+            _index.refresh()
+        return _index
+    finally:
+        _build_lock.release()
+
+
+def search(query, limit):
+    index = get_index()
+    if index is None:
+        return []
+    return index.search(query, limit)
+
+
+def product_saved(product_id, name):
+    # An index that is not built yet will read the product from the database
+    if _index is not None:
+        _index.add(product_id, name)
+
+
+def product_deleted(product_id):
+    if _index is not None:
+        _index.remove(product_id)
+
+
+def reset():
+    global _index
+    with _build_lock:
+        _index = None
@@ -0,0 +1,79 @@
+"""
+Computed results cached for every worker.
+
+Each result is stored under its name plus a version counter kept next to it
+in the configured cache. Invalidating increments the counter once the
+writing transaction commits, so every worker misses on its next read, and a
+result computed from rows read before the commit can only be stored under
+the old version, where nothing reads it again. Until then the writing
+transaction itself neither reads nor stores the result.
+
+Workers only see each other's invalidations through a cache they share,
+such as Redis or Memcached, set with ``CACHE_BACKEND``. The default
+per-process cache keeps each worker's results to itself.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _version_key(name):
+    return f'{name}:version'
+
+
+def get_version(name):
+    version = cache.get(_version_key(name))
+    if version is None:
+        # Starting from the clock, so a counter evicted and created again does not
+        # come back to a version an old result is still stored under. add() so that
+        # workers racing to create it agree on one.
+        cache.add(_version_key(name), time.time_ns() // 1000, None)
+        version = cache.get(_version_key(name))
+    return version
+
+
+class _Bump:
+    # The commit hook of one transaction's invalidation; it remembers having run
+    
+    def __init__(self, name):
+        self.name = name
+        self.done = False
+    
+    def __call__(self):
+        self.done = True
+        try:
+            cache.incr(_version_key(self.name))
+        except ValueError:
+            # Evicted: any new version is as good as an increment
+            get_version(self.name)
+
+
+def _pending(name):
+    # Whether the current transaction has invalidated the result and not committed yet
+    connection = transaction.get_connection()
+    return connection.in_atomic_block and any(
+        isinstance(func, _Bump) and func.name == name and not func.done
+        for _, func, *_ in connection.run_on_commit
+    )
+
+
+def get(name):
+    # Returns the version to store a fresh result under, and the cached result or None.
+    # A transaction that invalidated the result gets neither until it commits.
+    if _pending(name):
+        return None, None
+    version = get_version(name)
+    return version, cache.get(f'{name}:{version}')
+
+
+def set(name, version, value, timeout):
+    if version is not None:
+        cache.set(f'{name}:{version}', value, timeout)
+
+
+def invalidate(name):
+    # One increment per transaction, however many of its writes touch the result
+    if not _pending(name):
+        transaction.on_commit(_Bump(name))
@@ -0,0 +1,170 @@
+"""
+Demand forecasting and reorder suggestions.
+
+Daily sales per product are loaded in one grouped query over the hot and
+archived sales tables, then every statistic is computed with NumPy for all
+products at once. Sales are kept as sparse (product, day, units) rows, so
+memory grows with the number of product-days that actually had sales rather
+than products x days.
+
+NumPy is imported inside the functions that use it, so web workers that never
+compute a forecast do not pay for loading it.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import DateTimeField, Func, IntegerField, Sum, Value
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import caching
+from .models import ArchivedSale, Product, Sale
+
+CACHE_KEY = 'reorder-suggestions'
+
+
+class JulianDayOffset(Func):
+    # Whole days from start, using SQLite's native julianday() instead of a Python TruncDate
+    output_field = IntegerField()
+
+    def __init__(self, expression, start):
+        super().__init__(expression, Value(start, output_field=DateTimeField()))
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)',
+            arg_joiner=') - julianday(',
+            **extra_context
+        )
+
+
+def load_daily_sales(start, end):
+    # One query: units sold per product per day, from both sales tables
+    import numpy as np
+
+    sqlite = connection.vendor == 'sqlite'
+    day = JulianDayOffset('sale_date', start) if sqlite else TruncDate('sale_date')
+
+    def daily_units(model):
+        return (
+            model.objects.filter(sale_date__gte=start, sale_date__lt=end)
+            .order_by()
+            .values('product', day=day)
+            .annotate(units=Sum('quantity'))
+            .values_list('product', 'day', 'units')
+        )
+
+    rows = list(daily_units(Sale).union(daily_units(ArchivedSale), all=True))
+    if not rows:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float64)
+
+    product_ids, days, units = zip(*rows)
+    if sqlite:
+        day_index = np.array(days, np.int64)
+    else:
+        day_index = (
+            np.array(days, dtype='datetime64[D]') - np.datetime64(start.date(), 'D')
+        ).astype(np.int64)
+    return np.array(product_ids, np.int64), day_index, np.array(units, np.float64)
+
+
+def compute_suggestions(product_ids, quantities, sale_products, sale_days, sale_units, days,
+                        alpha=0.3, window=30, lead_time=7, cover_days=30, service_z=1.65):
+    """
+    Forecasts demand for every product from sparse daily sales.
+
+    ``product_ids`` must be sorted. ``sale_days`` counts from 0 (oldest) to
+    ``days - 1`` (yesterday). Returns a dict of arrays aligned with
+    ``product_ids``.
+    """
+    import numpy as np
+
+    count = len(product_ids)
+    rows = np.searchsorted(product_ids, sale_products)
+    # Sales for products that no longer exist are dropped
+    known = (rows < count) & (product_ids[np.minimum(rows, count - 1)] == sale_products)
+    rows, sale_days, sale_units = rows[known], sale_days[known], sale_units[known]
+
+    recent = sale_days >= days - window
+    velocity = np.bincount(rows[recent], weights=sale_units[recent], minlength=count) / window
+
+    # Simple exponential smoothing written as a weighted sum over each product's days
+    weights = alpha * (1 - alpha) ** (days - 1 - np.arange(days))
+    forecast = np.bincount(rows, weights=weights[sale_days] * sale_units, minlength=count)
+
+    # Daily demand variance, counting days without sales as zero
+    mean = np.bincount(rows, weights=sale_units, minlength=count) / days
+    mean_square = np.bincount(rows, weights=sale_units ** 2, minlength=count) / days
+    deviation = np.sqrt(np.maximum(mean_square - mean ** 2, 0))
+
+    with np.errstate(divide='ignore'):
+        days_until_stockout = np.where(forecast > 0, quantities / forecast, np.inf)
+
+    safety_stock = service_z * deviation * np.sqrt(lead_time)
+    reorder_point = forecast * lead_time + safety_stock
+    target = forecast * (lead_time + cover_days) + safety_stock
+    reorder_quantity = np.where(
+        quantities <= reorder_point, np.ceil(np.maximum(target - quantities, 0)), 0
+    ).astype(np.int64)
+
+    return {
+        'velocity': velocity,
+        'forecast': forecast,
+        'days_until_stockout': days_until_stockout,
+        'reorder_point': reorder_point,
+        'reorder_quantity': reorder_quantity,
+    }
+
+
+def reorder_suggestions():
+    # Products that should be reordered now, soonest stockout first; cached until the next sale
+    version, suggestions = caching.get(CACHE_KEY)
+    if suggestions is not None:
+        return suggestions
+
+    import numpy as np
+
+    days = getattr(settings, 'FORECAST_HISTORY_DAYS', 365)
+    end = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=days)
+
+    products = list(Product.objects.order_by('id').values_list('id', 'name', 'quantity'))
+    if not products:
+        return []
+    ids, names, quantities = zip(*products)
+    product_ids = np.array(ids, np.int64)
+
+    result = compute_suggestions(
+        product_ids,
+        np.array(quantities, np.float64),
+        *load_daily_sales(start, end),
+        days=days,
+        alpha=getattr(settings, 'FORECAST_SMOOTHING', 0.3),
+        lead_time=getattr(settings, 'REORDER_LEAD_TIME_DAYS', 7),
+        cover_days=getattr(settings, 'REORDER_COVER_DAYS', 30),
+    )
+
+    selected = np.flatnonzero(result['reorder_quantity'] > 0)
+    selected = selected[np.argsort(result['days_until_stockout'][selected], kind='stable')]
+    suggestions = [
+        {
+            'product': int(product_ids[i]),
+            'product_name': names[i],
+            'quantity': quantities[i],
+            'daily_velocity': round(float(result['velocity'][i]), 3),
+            'daily_forecast': round(float(result['forecast'][i]), 3),
+            'days_until_stockout': round(float(result['days_until_stockout'][i]), 1),
+            'reorder_point': round(float(result['reorder_point'][i]), 1),
+            'reorder_quantity': int(result['reorder_quantity'][i]),
+        }
+        for i in selected
+    ]
+    caching.set(CACHE_KEY, version, suggestions, getattr(settings, 'FORECAST_CACHE_SECONDS', 3600))
+    return suggestions
+
+
+def invalidate_reorder_suggestions():
+    caching.invalidate(CACHE_KEY)
@@ -0,0 +1,120 @@
+"""
+Database-backed background jobs.
+
+Request code calls ``enqueue()``, which adds one ``Job`` row once the current
+transaction commits. ``manage.py run_worker`` claims due jobs and runs the
+functions registered with ``@task`` in a thread or process pool, retrying
+failures with exponential backoff.
+"""
+
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name):
+    # Registers a function as the handler for jobs called name
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, payload=None, dedup_key=None, delay=0, max_attempts=None):
+    job = Job(
+        name=name,
+        payload=payload or {},
+        dedup_key=dedup_key,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or getattr(settings, 'JOB_MAX_ATTEMPTS', 5),
+    )
+    # A single INSERT after commit; a pending job with the same dedup_key absorbs it
+    transaction.on_commit(lambda: Job.objects.bulk_create([job], ignore_conflicts=True))
+
+
+def claim_jobs(limit):
+    now = timezone.now()
+    candidates = list(
+        Job.objects.filter(status=Job.Status.PENDING, run_at__lte=now)
+        .order_by('run_at')
+        .values_list('id', flat=True)[:limit]
+    )
+    claimed = []
+    for job_id in candidates:
+        # The status check makes the claim safe against other workers
+        if Job.objects.filter(id=job_id, status=Job.Status.PENDING).update(
+            status=Job.Status.RUNNING, locked_at=now, attempts=F('attempts') + 1
+        ):
+            claimed.append(job_id)
+    return claimed
+
+
+def run_job(job_id):
+    try:
+        job = Job.objects.get(id=job_id)
+    except Job.DoesNotExist:
+        # Deleted after it was claimed, e.g. by an admin
+        logger.warning("Job %s no longer exists", job_id)
+        close_old_connections()
+        return None
+    try:
+        func = TASKS[job.name]
+        func(job)
+    except Exception:
+        logger.warning("Job %s (%s) failed on attempt %s", job.id, job.name, job.attempts)
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = Job.Status.FAILED
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'finished_at', 'last_error'])
+        else:
+            backoff = getattr(settings, 'JOB_RETRY_BACKOFF', 30) * 2 ** (job.attempts - 1)
+            job.run_at = timezone.now() + timedelta(seconds=backoff)
+            return_to_queue(job)
+    else:
+        job.status = Job.Status.DONE
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'finished_at'])
+    finally:
+        close_old_connections()
+    return job.status
+
+
+def return_to_queue(job):
+    job.status = Job.Status.PENDING
+    job.locked_at = None
+    try:
+        with transaction.atomic():
+            job.save(update_fields=['status', 'locked_at', 'run_at', 'last_error'])
+    except IntegrityError:
+        # A newer pending job with the same dedup_key will do the work instead
+        job.status = Job.Status.FAILED
+        job.finished_at = timezone.now()
+        job.last_error += '\nSuperseded by a pending job with the same dedup_key.'
+        job.save(update_fields=['status', 'finished_at', 'last_error'])
+
+
+def requeue_stale_jobs():
+    # Jobs left RUNNING by a worker that died are handed out again, unless that was their last attempt
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 600))
+    stale = list(Job.objects.filter(status=Job.Status.RUNNING, locked_at__lt=cutoff))
+    for job in stale:
+        job.last_error += f"\nLost by its worker on attempt {job.attempts}."
+        if job.attempts >= job.max_attempts:
+            job.status = Job.Status.FAILED
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'finished_at', 'last_error'])
+        else:
+            return_to_queue(job)
+    return len(stale)
@@ -0,0 +1,62 @@
+from datetime import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from api.models import ArchivedSale, Sale
+
+ARCHIVED_FIELDS = [
+    'id', 'product_id', 'product_name', 'category_id', 'quantity', 'unit_price',
+    'total_price', 'sale_date', 'created_by_id', 'created_by_username',
+]
+
+
+class Command(BaseCommand):
+    help = 'Moves sales from closed months into the archive table in batches'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before',
+            help='Archive sales before this month (YYYY-MM). Defaults to keeping SALES_HOT_MONTHS months hot.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+    
+    def handle(self, *args, **options):
+        cutoff = self.get_cutoff(options['before'])
+        batch_size = options['batch_size']
+        total = 0
+        
+        while True:
+            # Each batch commits on its own so readers and writers are never blocked for long
+            with transaction.atomic():
+                rows = list(
+                    Sale.objects.filter(sale_date__lt=cutoff)
+                    .order_by('id')
+                    .values(*ARCHIVED_FIELDS)[:batch_size]
+                )
+                if not rows:
+                    break
+                ArchivedSale.objects.bulk_create(ArchivedSale(**row) for row in rows)
+                Sale.objects.filter(id__in=[row['id'] for row in rows]).delete()
+            total += len(rows)
+        
+        self.stdout.write(f"Archived {total} sales from before {cutoff:%Y-%m}.")
+    
+    def get_cutoff(self, before):
+        now = timezone.localtime()
+        if before:
+            try:
+                month = timezone.make_aware(datetime.strptime(before, '%Y-%m'))
+            except ValueError:
+                raise CommandError('--before must look like YYYY-MM.')
+            # Sales of the current month can still be changed, so only closed months are archived
+            if month > now.replace(day=1, hour=0, minute=0, second=0, microsecond=0):
+                raise CommandError('--before cannot be later than the current month.')
+            return month
+        
+        # First day of the oldest month that stays in the hot table
+        months = now.year * 12 + now.month - 1 - getattr(settings, 'SALES_HOT_MONTHS', 12)
+        return now.replace(
+            year=months // 12, month=months % 12 + 1, day=1,
+            hour=0, minute=0, second=0, microsecond=0
+        )
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from api.models import StockReservation
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired stock reservations in batches'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+    
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        
+        # Expired holds are already ignored by availability checks, so this only
+        # reclaims space; short batches keep each delete transaction small
+        while True:
+            ids = list(
+                StockReservation.objects.expired()
+                .order_by('expires_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            StockReservation.objects.filter(id__in=ids).delete()
+            total += len(ids)
+        
+        self.stdout.write(f"Deleted {total} expired reservations.")
@@ -0,0 +1,32 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.models import Tombstone
+
+
+class Command(BaseCommand):
+    help = 'Deletes deletion records older than TOMBSTONE_RETENTION_DAYS in batches'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+    
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        retention = timedelta(days=getattr(settings, 'TOMBSTONE_RETENTION_DAYS', 30))
+        cutoff = timezone.now() - retention
+        total = 0
+        
+        # Sync refuses cursors older than the retention period, so nothing still reads these
+        while True:
+            ids = list(
+                Tombstone.objects.filter(deleted_at__lt=cutoff)
+                .order_by('deleted_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            Tombstone.objects.filter(id__in=ids).delete()
+            total += len(ids)
+        
+        self.stdout.write(f"Deleted {total} tombstones.")
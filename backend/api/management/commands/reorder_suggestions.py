@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from api.forecasting import invalidate_reorder_suggestions, reorder_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Prints products forecast to run out and how many units to reorder'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=50)
+    
+    def handle(self, *args, **options):
+        # Recomputing also refreshes the cached result served by the API
+        invalidate_reorder_suggestions()
+        suggestions = reorder_suggestions()
+        
+        for suggestion in suggestions[:options['limit']]:
+            self.stdout.write(
+                f"{suggestion['product']:>8}  {suggestion['product_name'][:40]:<40}"
+                f"  stock {suggestion['quantity']:>6}"
+                f"  out in {suggestion['days_until_stockout']:>6} days"
+                f"  reorder {suggestion['reorder_quantity']:>6}"
+            )
+        self.stdout.write(f"{len(suggestions)} products need reordering.")
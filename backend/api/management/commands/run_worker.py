@@ -0,0 +1,72 @@
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from api.jobs import claim_jobs, requeue_stale_jobs, run_job
+
+logger = logging.getLogger('api.jobs')
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'JOB_WORKERS', 4))
+        parser.add_argument('--processes', action='store_true', help='Use a process pool instead of threads')
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--burst', action='store_true', help='Exit once no jobs are due')
+        parser.add_argument(
+            '--sweep-interval', type=float, default=60.0,
+            help='Seconds between checks for jobs lost by dead workers'
+        )
+    
+    def handle(self, *args, **options):
+        workers = options['workers']
+        poll_interval = options['poll_interval']
+        
+        self.sweep()
+        next_sweep = time.monotonic() + options['sweep_interval']
+        
+        # Forked processes must not share the parent's database connection
+        connections.close_all()
+        executor_class = ProcessPoolExecutor if options['processes'] else ThreadPoolExecutor
+        
+        with executor_class(max_workers=workers) as executor:
+            running = {}
+            while True:
+                if time.monotonic() >= next_sweep:
+                    # Other workers may have died since startup
+                    self.sweep()
+                    next_sweep = time.monotonic() + options['sweep_interval']
+                
+                claimed = claim_jobs(workers - len(running)) if len(running) < workers else []
+                running.update((executor.submit(run_job, job_id), job_id) for job_id in claimed)
+                
+                if not running:
+                    if options['burst']:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+                
+                done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        future.result()
+                    except Exception:
+                        # Task errors are stored on the job; this is the runner failing to load or
+                        # save it. The job stays RUNNING until the stale sweep picks it up.
+                        logger.exception("Worker failed while running job %s", job_id)
+        
+        self.stdout.write("No jobs due, exiting.")
+    
+    def sweep(self):
+        try:
+            requeued = requeue_stale_jobs()
+        except Exception:
+            logger.exception("Sweeping stale jobs failed")
+            return
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale jobs.")
@@ -0,0 +1,82 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:06
+
+from django.conf import settings
+from django.db import migrations, models, transaction
+from django.db.models import Max, Min, OuterRef, Subquery
+import django.db.models.deletion
+
+BATCH_SIZE = 5000
+
+
+def backfill_snapshots(apps, schema_editor):
+    # Copying product and seller details onto existing sales, one id range per transaction
+    alias = schema_editor.connection.alias
+    Product = apps.get_model('api', 'Product')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    product = Product.objects.using(alias).filter(pk=OuterRef('product_id'))
+    seller = User.objects.using(alias).filter(pk=OuterRef('created_by_id'))
+
+    for model_name in ('Sale', 'ArchivedSale'):
+        sales = apps.get_model('api', model_name).objects.using(alias)
+        bounds = sales.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            continue
+        for start in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+            with transaction.atomic(using=alias):
+                sales.filter(id__gte=start, id__lt=start + BATCH_SIZE).update(
+                    product_name=Subquery(product.values('name')[:1]),
+                    category=Subquery(product.values('category_id')[:1]),
+                    created_by_username=Subquery(seller.values('username')[:1]),
+                )
+
+
+class Migration(migrations.Migration):
+    # Batches commit separately instead of holding one lock over the whole sales table
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0006_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedsale',
+            name='category',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.category'),
+        ),
+        migrations.AddField(
+            model_name='archivedsale',
+            name='created_by_username',
+            field=models.CharField(blank=True, max_length=150),
+        ),
+        migrations.AddField(
+            model_name='archivedsale',
+            name='product_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='category',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.category'),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='created_by_username',
+            field=models.CharField(blank=True, max_length=150),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='product_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='sale',
+            name='api_sale_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['-sale_date', '-id'], include=('product', 'product_name', 'category', 'quantity', 'unit_price', 'total_price', 'created_by', 'created_by_username'), name='api_sale_ledger_idx'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:25
+
+from django.db import migrations, models, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+import django.db.models.deletion
+import django.utils.timezone
+
+BATCH_SIZE = 5000
+
+
+def seed_history(apps, schema_editor):
+    # Earlier prices and stock levels were never kept, so history starts with today's values
+    alias = schema_editor.connection.alias
+    Product = apps.get_model('api', 'Product')
+    PriceChange = apps.get_model('api', 'PriceChange')
+    StockMovement = apps.get_model('api', 'StockMovement')
+    products = Product.objects.using(alias)
+    now = timezone.now()
+
+    bounds = products.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return
+    for start in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+        with transaction.atomic(using=alias):
+            rows = list(
+                products.filter(id__gte=start, id__lt=start + BATCH_SIZE).values_list('id', 'price', 'quantity')
+            )
+            PriceChange.objects.using(alias).bulk_create(
+                PriceChange(product_id=product_id, price=price, valid_from=now)
+                for product_id, price, _ in rows
+            )
+            StockMovement.objects.using(alias).bulk_create(
+                StockMovement(
+                    product_id=product_id, quantity_change=quantity, quantity_after=quantity,
+                    reason='INITIAL', created_at=now,
+                )
+                for product_id, _, quantity in rows
+            )
+
+
+class Migration(migrations.Migration):
+    # Seeding commits one batch at a time, like 0007
+    atomic = False
+
+    dependencies = [
+        ('api', '0007_sale_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity_change', models.IntegerField()),
+                ('quantity_after', models.PositiveIntegerField()),
+                ('reason', models.CharField(choices=[('INITIAL', 'Initial stock'), ('SALE', 'Sale'), ('ADJUSTMENT', 'Adjustment')], max_length=10)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='api.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'created_at', 'id'], include=('quantity_after',), name='api_stockmove_seek_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PriceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('valid_from', models.DateTimeField()),
+                ('valid_to', models.DateTimeField(blank=True, null=True)),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='price_changes', to='api.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'valid_from'], include=('price',), name='api_pricechange_seek_idx')],
+            },
+        ),
+        migrations.RunPython(seed_history, migrations.RunPython.noop),
+    ]
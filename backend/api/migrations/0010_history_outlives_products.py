@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    # Price and stock history no longer cascade from products; existing rows need no
+    # backfill, since the snapshot columns are only filled in when a product is deleted
+
+    dependencies = [
+        ('api', '0009_covering_indexes_postgresql_only'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pricechange',
+            name='product_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='category',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.category'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='product_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='pricechange',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='price_changes', to='api.product'),
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='stock_movements', to='api.product'),
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='reason',
+            field=models.CharField(choices=[('INITIAL', 'Initial stock'), ('SALE', 'Sale'), ('ADJUSTMENT', 'Adjustment'), ('REMOVED', 'Product deleted')], max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(condition=models.Q(('reason', 'INITIAL')), fields=['created_at'], name='api_stockmove_initial_idx'),
+        ),
+    ]
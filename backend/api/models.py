@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.utils import timezone
 
@@ -7,7 +7,7 @@ class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)   
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
            
     class Meta:
         verbose_name_plural = 'Categories'
@@ -25,7 +25,7 @@ class Product(models.Model):
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to='products/', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         ordering = ['name']
@@ -37,6 +37,139 @@ class Product(models.Model):
     def is_low_stock(self):
         threshold = getattr(settings, 'STOCK_THRESHOLD', 5)
         return self.quantity <= threshold
+    
+    @property
+    def reserved_quantity(self):
+        # Units currently held by unexpired reservations
+        return self.reservations.active().aggregate(
+            total=models.Sum('quantity')
+        )['total'] or 0
+    
+    @property
+    def available_quantity(self):
+        return self.quantity - self.reserved_quantity
+    
+    def save(self, *args, movement_reason=None, **kwargs):
+        # Price and stock history are written in the same transaction as the product
+        with transaction.atomic():
+            previous = self.previous_values(kwargs.get('update_fields'))
+            super().save(*args, **kwargs)
+            self.record_history(previous, movement_reason)
+    
+    def previous_values(self, update_fields):
+        # Read from the locked row, not from when this instance was loaded: a stale instance
+        # must record the change it makes to whatever other writes left behind
+        if self._state.adding:
+            return None
+        fields = [
+            field for field in ('price', 'quantity')
+            if update_fields is None or field in update_fields
+        ]
+        if not fields:
+            return {}
+        return Product.objects.select_for_update().filter(pk=self.pk).values(*fields).first() or {}
+    
+    def record_history(self, previous, movement_reason):
+        now = timezone.now()
+        price = self._meta.get_field('price').to_python(self.price)
+        
+        if previous is None or ('price' in previous and previous['price'] != price):
+            PriceChange.objects.filter(product=self, valid_to__isnull=True).update(valid_to=now)
+            PriceChange.objects.create(product=self, price=price, valid_from=now)
+        
+        if previous is None:
+            change = self.quantity
+            reason = movement_reason or StockMovement.Reason.INITIAL
+        elif 'quantity' in previous and previous['quantity'] != self.quantity:
+            change = self.quantity - previous['quantity']
+            reason = movement_reason or StockMovement.Reason.ADJUSTMENT
+        else:
+            change = None
+        if change is not None:
+            StockMovement.objects.create(
+                product=self, quantity_change=change, quantity_after=self.quantity,
+                reason=reason, created_at=now
+            )
+    
+    def close_history(self):
+        # Called as the product is deleted: its history stays behind under its name and
+        # category, with the open price closed and a last movement taking its stock to zero
+        now = timezone.now()
+        PriceChange.objects.filter(product=self, valid_to__isnull=True).update(valid_to=now)
+        PriceChange.objects.filter(product=self).update(product_name=self.name)
+        StockMovement.objects.filter(product=self).update(
+            product_name=self.name, category_id=self.category_id
+        )
+        StockMovement.objects.create(
+            product=self, quantity_change=-self.quantity, quantity_after=0,
+            reason=StockMovement.Reason.REMOVED, created_at=now,
+            product_name=self.name, category_id=self.category_id,
+        )
+
+class PriceChange(models.Model):
+    # One row per price a product has had, valid from valid_from until valid_to (open while current)
+    
+    # The seek index below starts with product, so the foreign key needs no index of its own.
+    # History outlives the product: deleting one keeps its rows and their product id, and
+    # Product.close_history() fills in the name they are shown under from then on.
+    product = models.ForeignKey(
+        Product, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+        related_name='price_changes'
+    )
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    valid_from = models.DateTimeField()
+    valid_to = models.DateTimeField(null=True, blank=True)
+    product_name = models.CharField(max_length=255, blank=True)
+    
+    class Meta:
+        indexes = [
+            # The price at a timestamp is the last row at or before it: one seek per product.
+            # On PostgreSQL the index also carries price as an INCLUDE column (migration 0008).
+            models.Index(fields=['product', 'valid_from'], name='api_pricechange_seek_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} at {self.price} from {self.valid_from}"
+
+class StockMovement(models.Model):
+    # Every change to a product's quantity, with the quantity it left behind
+    
+    class Reason(models.TextChoices):
+        INITIAL = 'INITIAL', 'Initial stock'
+        SALE = 'SALE', 'Sale'
+        ADJUSTMENT = 'ADJUSTMENT', 'Adjustment'
+        REMOVED = 'REMOVED', 'Product deleted'
+    
+    # Kept when the product is deleted, like PriceChange.product. Every row has a product id;
+    # null is allowed only so joins to products are outer joins that keep deleted products.
+    product = models.ForeignKey(
+        Product, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+        null=True, related_name='stock_movements'
+    )
+    quantity_change = models.IntegerField()
+    quantity_after = models.PositiveIntegerField()
+    reason = models.CharField(max_length=10, choices=Reason.choices)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Filled in when the product is deleted, for reports that can no longer join to it
+    product_name = models.CharField(max_length=255, blank=True)
+    category = models.ForeignKey(
+        Category, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+        null=True, blank=True, related_name='+'
+    )
+    
+    class Meta:
+        indexes = [
+            # The stock at a timestamp is quantity_after of the last movement at or before it.
+            # On PostgreSQL the index also carries quantity_after as an INCLUDE column (migration 0008).
+            models.Index(fields=['product', 'created_at', 'id'], name='api_stockmove_seek_idx'),
+            # One INITIAL row per product ever created: the valuation walks these instead of products
+            models.Index(
+                fields=['created_at'], condition=models.Q(reason='INITIAL'), name='api_stockmove_initial_idx'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.quantity_change:+} x {self.product_id} ({self.reason})"
 
 class Sale(models.Model):
     
@@ -46,15 +179,184 @@ class Sale(models.Model):
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     sale_date = models.DateTimeField(default=timezone.now)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sales')
+    # Product and seller as they were at sale time, so ledger reads need no joins
+    product_name = models.CharField(max_length=255, blank=True)
+    category = models.ForeignKey(
+        Category, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+        null=True, blank=True, related_name='+'
+    )
+    created_by_username = models.CharField(max_length=150, blank=True)
+    
+    class Meta:
+        indexes = [
+            # Newest-first ledger pages. On PostgreSQL the index also INCLUDEs every listed
+            # column (migration 0007), which makes them index-only scans.
+            models.Index(fields=['-sale_date', '-id'], name='api_sale_ledger_idx'),
+        ]
     
     def __str__(self):
-        return f"Sale of {self.product.name} - {self.quantity} units"
+        return f"Sale of {self.product_name} - {self.quantity} units"
     
     def save(self, *args, **kwargs):
-        if not self.pk:  # Only reduce stock on creation, not on updates
-            self.product.quantity -= self.quantity
-            self.product.save()
-        
         self.total_price = self.quantity * self.unit_price
         
-        super().save(*args, **kwargs)
\ No newline at end of file
+        # One write transaction for the stock change and the sale row
+        with transaction.atomic():
+            if not self.pk:  # Only reduce stock on creation, not on updates
+                # Re-reading inside the transaction so concurrent sales don't overwrite each other's stock
+                self.product = Product.objects.select_for_update().get(pk=self.product_id)
+                # Checked again under the lock: the serializer's check can race with other sales and
+                # holds. A hold being confirmed has already been deleted, so its units count here.
+                available = self.product.available_quantity
+                if available < self.quantity:
+                    raise InsufficientStock(f"Not enough stock available. Only {available} units left.")
+                self.product.quantity -= self.quantity
+                self.product.save(movement_reason=StockMovement.Reason.SALE)
+                self.product_name = self.product.name
+                self.category_id = self.product.category_id
+                self.created_by_username = self.created_by.username
+            
+            super().save(*args, **kwargs)
+
+class ArchivedSale(models.Model):
+    # Sales from closed periods, moved out of the hot Sale table by archive_sales
+    
+    # Keeps the id the sale had in the Sale table
+    id = models.BigIntegerField(primary_key=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='archived_sales')
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    sale_date = models.DateTimeField()
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_sales')
+    product_name = models.CharField(max_length=255, blank=True)
+    category = models.ForeignKey(
+        Category, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+        null=True, blank=True, related_name='+'
+    )
+    created_by_username = models.CharField(max_length=150, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['sale_date'], name='api_archsale_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Archived sale {self.id} - {self.quantity} units"
+
+def sale_history(*fields, **expressions):
+    # Hot and archived sales as one queryset of dicts, for reports over the full ledger
+    return Sale.objects.order_by().values(*fields, **expressions).union(
+        ArchivedSale.objects.order_by().values(*fields, **expressions), all=True
+    )
+
+class InsufficientStock(Exception):
+    # Stock under the product lock no longer covers a sale or the hold being confirmed
+    pass
+
+class StockReservationQuerySet(models.QuerySet):
+    
+    def active(self):
+        return self.filter(expires_at__gt=timezone.now())
+    
+    def expired(self):
+        return self.filter(expires_at__lte=timezone.now())
+
+class StockReservation(models.Model):
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reservations')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    objects = StockReservationQuerySet.as_manager()
+    
+    class Meta:
+        ordering = ['expires_at']
+        indexes = [
+            # Covers the "active holds for this product" sum
+            models.Index(fields=['product', 'expires_at'], name='api_reserv_prod_exp_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Hold of {self.quantity} x {self.product_id} until {self.expires_at}"
+    
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+    
+    def confirm(self):
+        # Turning the hold into a sale
+        with transaction.atomic():
+            product = Product.objects.select_for_update().get(pk=self.product_id)
+            # Deleting first so a hold can only ever be confirmed once
+            claimed, _ = StockReservation.objects.active().filter(pk=self.pk).delete()
+            if not claimed:
+                raise StockReservation.DoesNotExist("Reservation has expired or was already used.")
+            # Stock corrections can lower on-hand stock below the held units; rolling back keeps the hold
+            if product.quantity < self.quantity:
+                raise InsufficientStock(
+                    f"Not enough stock on hand. Only {product.quantity} units left."
+                )
+            sale = Sale(
+                product=product,
+                quantity=self.quantity,
+                unit_price=product.price,
+                created_by_id=self.created_by_id,
+            )
+            sale.save()
+        return sale
+
+class Tombstone(models.Model):
+    # Records hard deletes so offline clients can drop rows they still hold
+    
+    model_name = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'model_name'], name='api_tombstone_deleted_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.model_name} {self.object_id} deleted at {self.deleted_at}"
+
+class Job(models.Model):
+    # Background work queued by api.jobs.enqueue and run by manage.py run_worker
+    
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        RUNNING = 'RUNNING', 'Running'
+        DONE = 'DONE', 'Done'
+        FAILED = 'FAILED', 'Failed'
+    
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    # Only one pending job may exist per key; later enqueues are dropped
+    dedup_key = models.CharField(max_length=200, blank=True, null=True)
+    status = models.CharField(max_length=7, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            # The worker's "what is due" scan
+            models.Index(fields=['status', 'run_at'], name='api_job_due_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=models.Q(status='PENDING'),
+                name='api_job_pending_dedup_key',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.status})"
@@ -0,0 +1,127 @@
+"""
+Aggregate reports over the catalog.
+
+Per-category statistics come from one grouped query over ``Category`` and
+its products, with recent revenue added as a correlated subquery over
+``Sale`` so the sales join cannot multiply the product sums. The result for
+every category is cached as a single dict in the shared cache, and a new
+version is started whenever a category, product or sale is written (see
+``api.caching``).
+
+Inventory valuation at a past moment reads ``PriceChange`` and
+``StockMovement``: for each product, the price and the stock left by the
+last row at or before that moment, each found by one index seek in a single
+query, then multiplied and summed per category. Deleted products keep their
+history, so they still count towards moments before they were deleted.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import caching
+from .models import Category, PriceChange, Sale, StockMovement
+
+CATEGORY_STATS_CACHE_KEY = 'category-stats'
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+EMPTY_CATEGORY_STATS = {
+    'product_count': 0,
+    'total_units': 0,
+    'inventory_value': Decimal('0.00'),
+    'low_stock_count': 0,
+    'revenue_30d': Decimal('0.00'),
+}
+
+
+def category_stats():
+    # Stats for every category keyed by id; one query on a cache miss
+    version, stats = caching.get(CATEGORY_STATS_CACHE_KEY)
+    if stats is not None:
+        return stats
+
+    threshold = getattr(settings, 'STOCK_THRESHOLD', 5)
+    revenue = (
+        Sale.objects.filter(
+            product__category=OuterRef('pk'),
+            sale_date__gte=timezone.now() - timedelta(days=30),
+        )
+        .order_by()
+        .values('product__category')
+        .annotate(total=Sum('total_price'))
+        .values('total')
+    )
+    rows = (
+        Category.objects.order_by()
+        .annotate(
+            product_count=Count('products'),
+            total_units=Coalesce(Sum('products__quantity'), 0),
+            inventory_value=Coalesce(
+                Sum(F('products__quantity') * F('products__price'), output_field=MONEY),
+                Value(Decimal('0.00')),
+                output_field=MONEY,
+            ),
+            low_stock_count=Count('products', filter=Q(products__quantity__lte=threshold)),
+            revenue_30d=Coalesce(
+                Subquery(revenue, output_field=MONEY),
+                Value(Decimal('0.00')),
+                output_field=MONEY,
+            ),
+        )
+        .values('id', *EMPTY_CATEGORY_STATS)
+    )
+    stats = {row.pop('id'): row for row in rows}
+    caching.set(
+        CATEGORY_STATS_CACHE_KEY, version, stats, getattr(settings, 'CATEGORY_STATS_CACHE_SECONDS', 300)
+    )
+    return stats
+
+
+def invalidate_category_stats():
+    caching.invalidate(CATEGORY_STATS_CACHE_KEY)
+
+
+def inventory_valuation(at):
+    # Units and value per category at the given moment, using current categories and,
+    # for products deleted since, the category they were deleted from
+    price = (
+        PriceChange.objects.filter(product=OuterRef('product_id'), valid_from__lte=at)
+        .order_by('-valid_from')
+        .values('price')[:1]
+    )
+    stock = (
+        StockMovement.objects.filter(product=OuterRef('product_id'), created_at__lte=at)
+        .order_by('-created_at', '-id')
+        .values('quantity_after')[:1]
+    )
+    # One row per product created by then, deleted or not. The subqueries are selected once
+    # and the rows are summed here: filtering or aggregating on them in SQL would repeat
+    # each subquery in WHERE and in every SUM, seeking the indexes again for every product.
+    rows = (
+        StockMovement.objects.filter(reason=StockMovement.Reason.INITIAL, created_at__lte=at)
+        .order_by()
+        .annotate(
+            price_at=Subquery(price),
+            units_at=Subquery(stock),
+            category_at=Coalesce('product__category', 'category'),
+            category_name_at=Coalesce('product__category__name', 'category__name'),
+        )
+        .values_list('category_at', 'category_name_at', 'units_at', 'price_at')
+    )
+    categories = {}
+    for category, name, units, unit_price in rows:
+        if not units or unit_price is None:
+            continue
+        row = categories.setdefault(category, {
+            'category': category, 'category__name': name,
+            'units': 0, 'value': Decimal('0.00'), 'product_count': 0,
+        })
+        row['units'] += units
+        row['value'] += units * unit_price
+        row['product_count'] += 1
+    return sorted(categories.values(), key=lambda row: row['category__name'] or '')
@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from .models import Category, Product, Sale
+from django.conf import settings
+from .models import Category, Product, Sale, StockReservation
+from .reports import EMPTY_CATEGORY_STATS
 
 class CategorySerializer(serializers.ModelSerializer):
     
@@ -8,6 +10,42 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+class CategoryStatsSerializer(serializers.Serializer):
+    
+    product_count = serializers.IntegerField()
+    total_units = serializers.IntegerField()
+    inventory_value = serializers.DecimalField(max_digits=14, decimal_places=2)
+    low_stock_count = serializers.IntegerField()
+    revenue_30d = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+class CategoryValuationSerializer(serializers.Serializer):
+    
+    category = serializers.IntegerField()
+    category_name = serializers.CharField(source='category__name')
+    product_count = serializers.IntegerField()
+    units = serializers.IntegerField()
+    value = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+class InventoryValuationSerializer(serializers.Serializer):
+    
+    at = serializers.DateTimeField()
+    product_count = serializers.IntegerField()
+    total_units = serializers.IntegerField()
+    total_value = serializers.DecimalField(max_digits=14, decimal_places=2)
+    categories = CategoryValuationSerializer(many=True)
+
+class CategoryWithStatsSerializer(CategorySerializer):
+    
+    stats = serializers.SerializerMethodField()
+    
+    class Meta(CategorySerializer.Meta):
+        fields = CategorySerializer.Meta.fields + ['stats']
+    
+    def get_stats(self, obj):
+        # Looked up in the precomputed stats for all categories, not queried per row
+        stats = self.context['category_stats'].get(obj.id, EMPTY_CATEGORY_STATS)
+        return CategoryStatsSerializer(stats).data
+
 class ProductSerializer(serializers.ModelSerializer):
     
     category_name = serializers.ReadOnlyField(source='category.name')
@@ -30,26 +68,34 @@ class ProductListSerializer(ProductSerializer):
         ]
 
 class SaleSerializer(serializers.ModelSerializer):
-    
-    product_name = serializers.ReadOnlyField(source='product.name')
-    created_by_username = serializers.ReadOnlyField(source='created_by.username')
+    # Names are the snapshot stored on the sale, not the current product or user
     
     class Meta:
         model = Sale
         fields = [
-            'id', 'product', 'product_name', 'quantity', 'unit_price',
+            'id', 'product', 'product_name', 'category', 'quantity', 'unit_price',
             'total_price', 'sale_date', 'created_by', 'created_by_username'
         ]
-        read_only_fields = ['id', 'total_price', 'created_by']
+        read_only_fields = [
+            'id', 'product_name', 'category', 'total_price', 'created_by', 'created_by_username'
+        ]
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.instance is not None:
+            # Stock and the name snapshot were taken from this product when the sale was made
+            fields['product'].read_only = True
+        return fields
     
     def validate(self, attrs):
         # Validating that there is enough stock for the sale
-        product = attrs['product']
+        product = attrs['product'] if self.instance is None else self.instance.product
         quantity = attrs['quantity']
+        available = product.available_quantity
         
-        if product.quantity < quantity:
+        if available < quantity:
             raise serializers.ValidationError(
-                f"Not enough stock available. Only {product.quantity} units left."
+                f"Not enough stock available. Only {available} units left."
             )
         
         return attrs
@@ -57,4 +103,59 @@ class SaleSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         validated_data['created_by'] = self.context['request'].user
         validated_data['unit_price'] = validated_data['product'].price
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
+
+class SaleHistorySerializer(serializers.Serializer):
+    # Read-only rows from sale_history(), covering both hot and archived sales
+    
+    id = serializers.IntegerField()
+    product = serializers.IntegerField()
+    product_name = serializers.CharField()
+    category = serializers.IntegerField(allow_null=True)
+    quantity = serializers.IntegerField()
+    unit_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    sale_date = serializers.DateTimeField()
+    created_by = serializers.IntegerField()
+    created_by_username = serializers.CharField()
+    archived = serializers.BooleanField()
+
+class StockReservationSerializer(serializers.ModelSerializer):
+    
+    product_name = serializers.ReadOnlyField(source='product.name')
+    
+    class Meta:
+        model = StockReservation
+        fields = [
+            'id', 'product', 'product_name', 'quantity', 'created_by',
+            'created_at', 'expires_at'
+        ]
+        read_only_fields = fields
+
+class ReserveStockSerializer(serializers.Serializer):
+    
+    quantity = serializers.IntegerField(min_value=1)
+    ttl = serializers.IntegerField(min_value=1, required=False)
+    
+    def validate_ttl(self, value):
+        max_ttl = getattr(settings, 'RESERVATION_MAX_TTL', 3600)
+        if value > max_ttl:
+            raise serializers.ValidationError(f"Must be at most {max_ttl} seconds.")
+        return value
+
+class BatchOperationSerializer(serializers.Serializer):
+    
+    method = serializers.ChoiceField(choices=['GET', 'POST', 'PUT', 'PATCH', 'DELETE'])
+    path = serializers.CharField()
+    body = serializers.JSONField(required=False)
+
+class BatchSerializer(serializers.Serializer):
+    
+    operations = BatchOperationSerializer(many=True, allow_empty=False)
+    atomic = serializers.BooleanField(default=False)
+    
+    def validate_operations(self, value):
+        max_operations = getattr(settings, 'BATCH_MAX_OPERATIONS', 100)
+        if len(value) > max_operations:
+            raise serializers.ValidationError(f"At most {max_operations} operations per batch.")
+        return value
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from . import autocomplete
+from .forecasting import invalidate_reorder_suggestions
+from .jobs import enqueue
+from .reports import invalidate_category_stats
+from .tasks import LOW_STOCK_DIGEST
+from .models import Category, Product, Sale, Tombstone
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Product)
+def record_tombstone(sender, instance, **kwargs):
+    # Hard deletes leave no updated_at behind, so the sync feed needs a marker
+    Tombstone.objects.create(
+        model_name=sender._meta.model_name,
+        object_id=instance.pk,
+    )
+
+
+@receiver(pre_delete, sender=Product)
+def keep_product_history(sender, instance, **kwargs):
+    # Also sent for products deleted along with their category or in a queryset delete
+    instance.close_history()
+
+
+@receiver(post_save, sender=Sale)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def refresh_reorder_suggestions(sender, **kwargs):
+    # New sales and stock changes both move the forecast
+    invalidate_reorder_suggestions()
+
+
+@receiver(post_save, sender=Sale)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def refresh_category_stats(sender, **kwargs):
+    # Sales are only deleted by archiving, long after they leave the 30-day revenue window
+    invalidate_category_stats()
+
+
+@receiver(post_save, sender=Product)
+def queue_low_stock_alert(sender, instance, **kwargs):
+    # Products going low within the delay share one pending digest job
+    if instance.quantity <= getattr(settings, 'STOCK_THRESHOLD', 5):
+        enqueue(
+            LOW_STOCK_DIGEST,
+            dedup_key=LOW_STOCK_DIGEST,
+            delay=getattr(settings, 'LOW_STOCK_DIGEST_DELAY', 300),
+        )
+
+
+@receiver(post_save, sender=Product)
+def index_product_name(sender, instance, **kwargs):
+    # Applied on commit so a rolled-back save never shows up in autocomplete
+    product_id, name = instance.pk, instance.name
+    transaction.on_commit(lambda: autocomplete.product_saved(product_id, name))
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_name(sender, instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: autocomplete.product_deleted(product_id))
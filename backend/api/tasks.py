@@ -0,0 +1,36 @@
+import logging
+
+from django.conf import settings
+from django.core.mail import mail_admins
+
+from .jobs import task
+from .models import Job, Product
+
+logger = logging.getLogger(__name__)
+
+LOW_STOCK_DIGEST = 'low_stock_digest'
+
+
+@task(LOW_STOCK_DIGEST)
+def low_stock_digest(job):
+    # One alert covering every product that went low since the previous digest
+    threshold = getattr(settings, 'STOCK_THRESHOLD', 5)
+    # Since the previous digest was claimed rather than finished, so a product going low
+    # while it ran is reported again instead of never
+    previous = (
+        Job.objects.filter(name=LOW_STOCK_DIGEST, status=Job.Status.DONE)
+        .order_by('-locked_at')
+        .values_list('locked_at', flat=True)
+        .first()
+    )
+    products = Product.objects.filter(quantity__lte=threshold).order_by('quantity', 'name')
+    if previous:
+        products = products.filter(updated_at__gt=previous)
+    lines = [f"{product.name}: {product.quantity} left" for product in products]
+    if not lines:
+        return
+    
+    message = "\n".join(lines)
+    logger.warning("Low stock on %s products:\n%s", len(lines), message)
+    if settings.ADMINS:
+        mail_admins(f"Low stock on {len(lines)} products", message)
@@ -1,10 +1,55 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+from io import StringIO
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.conf import settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
-from .models import Category, Product, Sale
+import numpy as np
+from . import autocomplete, caching, forecasting, reports
+from .forecasting import compute_suggestions
+from .serializers import SaleSerializer
+from .jobs import claim_jobs, enqueue, requeue_stale_jobs, run_job, task
+from .models import (
+    ArchivedSale,
+    Category,
+    InsufficientStock,
+    PriceChange,
+    Product,
+    Sale,
+    StockMovement,
+    StockReservation,
+    Job,
+    Tombstone,
+    sale_history,
+)
 from decimal import Decimal
+from datetime import timedelta
+from django.utils import timezone
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.cache import cache
+from django.db import OperationalError, connection, connections, router
+from django.test.utils import CaptureQueriesContext
+from django.test import override_settings
+from backend.compression import negotiate
+from backend.middleware import CompressionMiddleware
+from backend.sqlite.base import DatabaseWrapper as ProductionSQLiteWrapper
+from backend.db_routers import (
+    enable_replica_reads,
+    disable_replica_reads,
+    is_pinned_to_primary,
+    PIN_COOKIE,
+)
 
 User = get_user_model()
 
@@ -70,6 +115,360 @@ class CategoryTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
         self.assertEqual(Category.objects.count(), 1)
 
+class CategoryStatsTests(TestCase):
+    """Test per-category statistics on the category API."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@example.com',
+            password='testpass123',
+            role='USER'
+        )
+        self.client.force_authenticate(user=self.user)
+        # Run as if committed, so the invalidations they queue are not still pending
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = Category.objects.create(name='Tools')
+            self.empty = Category.objects.create(name='Empty')
+            self.hammer = Product.objects.create(
+                name='Hammer', category=self.category, price=Decimal('10.00'), quantity=20
+            )
+            Product.objects.create(
+                name='Nails', category=self.category, price=Decimal('0.50'), quantity=3
+            )
+            Sale.objects.create(
+                product=self.hammer, quantity=2, unit_price=Decimal('10.00'), created_by=self.user
+            )
+            Sale.objects.create(
+                product=self.hammer, quantity=1, unit_price=Decimal('10.00'), created_by=self.user,
+                sale_date=timezone.now() - timedelta(days=45)
+            )
+        self.url = reverse('category-list') + '?stats=true'
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def stats_by_name(self):
+        res = self.client.get(self.url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return {row['name']: row['stats'] for row in res.data['results']}
+
+    def test_category_stats(self):
+        """Test the stats of a category with products and of an empty one."""
+        stats = self.stats_by_name()
+        
+        self.assertEqual(stats['Tools'], {
+            'product_count': 2,
+            'total_units': 20,
+            'inventory_value': '171.50',
+            'low_stock_count': 1,
+            'revenue_30d': '20.00',
+        })
+        self.assertEqual(stats['Empty']['product_count'], 0)
+        self.assertEqual(stats['Empty']['inventory_value'], '0.00')
+
+    def test_stats_are_optional(self):
+        """Test that plain category reads do not include stats."""
+        res = self.client.get(reverse('category-detail', args=[self.category.id]))
+        
+        self.assertNotIn('stats', res.data)
+
+    def test_constant_queries(self):
+        """Test that a page of categories with stats needs a fixed number of queries."""
+        with CaptureQueriesContext(connection) as before:
+            self.stats_by_name()
+        cache.clear()
+        for i in range(20):
+            category = Category.objects.create(name=f'Category {i}')
+            Product.objects.create(name=f'Product {i}', category=category, price=1, quantity=i)
+        cache.clear()
+        with CaptureQueriesContext(connection) as after:
+            self.stats_by_name()
+        
+        self.assertEqual(len(before), len(after))
+
+    def test_stats_are_cached_until_writes(self):
+        """Test that stats are served from cache and refreshed after a sale."""
+        self.stats_by_name()
+        with CaptureQueriesContext(connection) as cached:
+            self.stats_by_name()
+        self.assertFalse(any('SUM(' in q['sql'] for q in cached.captured_queries))
+        
+        Sale.objects.create(
+            product=self.hammer, quantity=5, unit_price=Decimal('10.00'), created_by=self.user
+        )
+        stats = self.stats_by_name()
+        
+        self.assertEqual(stats['Tools']['revenue_30d'], '70.00')
+        self.assertEqual(stats['Tools']['total_units'], 15)
+
+    def test_a_sale_bumps_the_version_once_on_commit(self):
+        """Test that a sale invalidates stats once, when it commits, and bypasses them until then."""
+        version = caching.get_version(reports.CATEGORY_STATS_CACHE_KEY)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Sale.objects.create(
+                product=self.hammer, quantity=5, unit_price=Decimal('10.00'), created_by=self.user
+            )
+            self.assertEqual(caching.get(reports.CATEGORY_STATS_CACHE_KEY), (None, None))
+            self.assertEqual(caching.get_version(reports.CATEGORY_STATS_CACHE_KEY), version)
+        
+        names = [getattr(callback, 'name', None) for callback in callbacks]
+        self.assertEqual(names.count(reports.CATEGORY_STATS_CACHE_KEY), 1)
+        self.assertEqual(names.count(forecasting.CACHE_KEY), 1)
+        self.assertEqual(caching.get_version(reports.CATEGORY_STATS_CACHE_KEY), version + 1)
+
+    def test_stats_computed_before_a_write_are_not_kept(self):
+        """Test that stats another worker computed before a stock change committed are never served."""
+        version, _ = caching.get(reports.CATEGORY_STATS_CACHE_KEY)
+        stale = reports.category_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hammer.quantity = 0
+            self.hammer.save()
+        # The other worker finishes and stores what it read before the change
+        caching.set(reports.CATEGORY_STATS_CACHE_KEY, version, stale, 300)
+        
+        self.assertEqual(self.stats_by_name()['Tools']['total_units'], 3)
+
+class InventoryValuationTests(TestCase):
+    """Test price and stock history and the point-in-time valuation report."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='ADMIN'
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.tools = Category.objects.create(name='Tools')
+        self.fixings = Category.objects.create(name='Fixings')
+        self.start = timezone.now()
+        self.hammer = Product.objects.create(
+            name='Hammer', category=self.tools, price=Decimal('10.00'), quantity=20
+        )
+        Product.objects.create(name='Nails', category=self.fixings, price=Decimal('5.00'), quantity=4)
+        self.created = timezone.now()
+        self.url = reverse('inventory-valuation')
+
+    def valuation(self, at):
+        res = self.client.get(self.url, {'at': at.isoformat()})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_history_is_recorded(self):
+        """Test that price changes close the previous interval and stock changes are logged."""
+        self.hammer.price = Decimal('12.00')
+        self.hammer.save()
+        self.hammer.name = 'Claw Hammer'
+        self.hammer.save()
+        Sale.objects.create(
+            product=self.hammer, quantity=5, unit_price=Decimal('12.00'), created_by=self.admin
+        )
+        
+        prices = list(self.hammer.price_changes.order_by('valid_from'))
+        self.assertEqual([p.price for p in prices], [Decimal('10.00'), Decimal('12.00')])
+        self.assertEqual(prices[0].valid_to, prices[1].valid_from)
+        self.assertIsNone(prices[1].valid_to)
+        
+        movements = list(self.hammer.stock_movements.order_by('id').values_list(
+            'reason', 'quantity_change', 'quantity_after'
+        ))
+        self.assertEqual(movements, [('INITIAL', 20, 20), ('SALE', -5, 15)])
+
+    def test_history_compares_with_the_stored_row(self):
+        """Test that refreshed instances record nothing twice and stale ones record what they change."""
+        self.hammer.price = Decimal('12.00')
+        self.hammer.save()
+        self.hammer.refresh_from_db()
+        self.hammer.save()
+        self.assertEqual(self.hammer.price_changes.count(), 2)
+        
+        stale = Product.objects.get(pk=self.hammer.pk)
+        Sale.objects.create(
+            product=self.hammer, quantity=1, unit_price=Decimal('12.00'), created_by=self.admin
+        )
+        # Written back from before the sale, e.g. by a PUT that loaded the product earlier
+        stale.save()
+        
+        movements = list(self.hammer.stock_movements.order_by('id').values_list('reason', 'quantity_after'))
+        self.assertEqual(movements, [('INITIAL', 20), ('SALE', 19), ('ADJUSTMENT', 20)])
+        self.hammer.refresh_from_db()
+        self.assertEqual(self.hammer.quantity, 20)
+
+    def test_valuation_at_points_in_time(self):
+        """Test that the report values stock at the prices and quantities of the time asked for."""
+        self.hammer.price = Decimal('12.00')
+        self.hammer.save()
+        repriced = timezone.now()
+        Sale.objects.create(
+            product=self.hammer, quantity=5, unit_price=Decimal('12.00'), created_by=self.admin
+        )
+        
+        self.assertEqual(self.valuation(self.start)['categories'], [])
+        self.assertEqual(self.valuation(self.start)['total_value'], '0.00')
+        self.assertEqual(self.valuation(self.created)['total_value'], '220.00')
+        self.assertEqual(self.valuation(repriced)['total_value'], '260.00')
+        
+        data = self.valuation(timezone.now())
+        self.assertEqual(data['total_value'], '200.00')
+        self.assertEqual(data['total_units'], 19)
+        self.assertEqual(
+            [(row['category_name'], row['units'], row['value']) for row in data['categories']],
+            [('Fixings', 4, '20.00'), ('Tools', 15, '180.00')]
+        )
+
+    def test_deleting_a_product_keeps_its_history(self):
+        """Test that a deleted product's history stays and still values the moments before it went."""
+        self.tools.products.create(name='Saw', price=Decimal('30.00'), quantity=2)
+        self.hammer.category = self.fixings
+        self.hammer.save()
+        before = timezone.now()
+        product_id = self.hammer.id
+        
+        Product.objects.filter(name='Hammer').delete()
+        
+        self.assertEqual(PriceChange.objects.filter(product_id=product_id).get().product_name, 'Hammer')
+        movements = list(StockMovement.objects.filter(product_id=product_id).order_by('id').values_list(
+            'reason', 'quantity_after', 'product_name', 'category'
+        ))
+        self.assertEqual(movements, [
+            ('INITIAL', 20, 'Hammer', self.fixings.id), ('REMOVED', 0, 'Hammer', self.fixings.id)
+        ])
+        self.assertEqual(self.valuation(self.created)['total_value'], '220.00')
+        data = self.valuation(before)
+        self.assertEqual(
+            [(row['category_name'], row['product_count'], row['value']) for row in data['categories']],
+            [('Fixings', 2, '220.00'), ('Tools', 1, '60.00')]
+        )
+        self.assertEqual(self.valuation(timezone.now())['total_value'], '80.00')
+
+    def test_valuation_is_one_query(self):
+        """Test that the valuation runs as a single query however many products there are."""
+        with CaptureQueriesContext(connection) as queries:
+            reports.inventory_valuation(timezone.now())
+        
+        self.assertEqual(len(queries.captured_queries), 1)
+
+    def test_valuation_parameters(self):
+        """Test dates, the default of now, bad values and permissions."""
+        today = self.client.get(self.url, {'at': timezone.localdate().isoformat()})
+        self.assertEqual(today.data['total_value'], '220.00')
+        self.assertEqual(self.client.get(self.url).data['total_value'], '220.00')
+        
+        res = self.client.get(self.url, {'at': 'yesterday'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        user = User.objects.create_user(
+            username='user', email='user@example.com', password='testpass123', role='USER'
+        )
+        self.client.force_authenticate(user=user)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ProductAutocompleteTests(TestCase):
+    """Test the product autocomplete endpoint and its prefix index."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@example.com',
+            password='testpass123',
+            role='USER'
+        )
+        self.category = Category.objects.create(name='Tools')
+        for name in ['Claw Hammer', 'Hammer Drill', 'Crème Brûlée Torch', 'Saw']:
+            Product.objects.create(name=name, category=self.category, price=1, quantity=10)
+        self.url = reverse('product-autocomplete')
+        autocomplete.reset()
+
+    def tearDown(self):
+        autocomplete.reset()
+
+    def names(self, query, **params):
+        res = self.client.get(self.url, {'q': query, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [row['name'] for row in res.data]
+
+    def test_autocomplete_requires_authentication(self):
+        """Test that anonymous clients cannot query the index."""
+        res = self.client.get(self.url, {'q': 'ham'})
+        
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_prefix_matches_any_word(self):
+        """Test that the query matches the start of any word, ignoring case and accents."""
+        self.client.force_authenticate(user=self.user)
+        
+        self.assertEqual(self.names('HAM'), ['Claw Hammer', 'Hammer Drill'])
+        self.assertEqual(self.names('brulee'), ['Crème Brûlée Torch'])
+        self.assertEqual(self.names('amm'), [])
+        self.assertEqual(self.names(''), [])
+
+    def test_results_are_capped(self):
+        """Test that limit is honoured but never exceeds AUTOCOMPLETE_MAX_RESULTS."""
+        self.client.force_authenticate(user=self.user)
+        
+        self.assertEqual(len(self.names('ham', limit=1)), 1)
+        with override_settings(AUTOCOMPLETE_MAX_RESULTS=1):
+            self.assertEqual(len(self.names('ham', limit=50)), 1)
+
+    def test_no_queries_once_built(self):
+        """Test that lookups after the first do not touch the database."""
+        self.client.force_authenticate(user=self.user)
+        self.names('saw')
+        
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.names('saw'), ['Saw'])
+        
+        self.assertEqual(len(queries), 0)
+
+    def test_index_follows_product_writes(self):
+        """Test that committed renames, creations and deletions update the index."""
+        self.client.force_authenticate(user=self.user)
+        self.names('saw')
+        saw = Product.objects.get(name='Saw')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            saw.name = 'Hacksaw'
+            saw.save()
+            Product.objects.create(name='Sawhorse', category=self.category, price=1, quantity=1)
+            Product.objects.get(name='Claw Hammer').delete()
+        
+        self.assertEqual(self.names('saw'), ['Sawhorse'])
+        self.assertEqual(self.names('hack'), ['Hacksaw'])
+        self.assertEqual(self.names('claw'), [])
+
+    def test_index_refreshes_from_database(self):
+        """Test that changes made by another process are picked up on refresh."""
+        self.client.force_authenticate(user=self.user)
+        self.names('saw')
+        # Without the commit callbacks, only the refresh can see these writes
+        Product.objects.create(name='Sander', category=self.category, price=1, quantity=1)
+        Product.objects.get(name='Saw').delete()
+        
+        self.assertEqual(self.names('sa'), ['Saw'])
+        with override_settings(AUTOCOMPLETE_REFRESH_SECONDS=0):
+            self.assertEqual(self.names('sa'), ['Sander'])
+
+    def test_lookups_do_not_wait_for_builds(self):
+        """Test that requests arriving while another request builds or refreshes the index are answered at once."""
+        self.client.force_authenticate(user=self.user)
+        # Another request is building the index
+        with autocomplete._build_lock:
+            self.assertEqual(self.names('saw'), [])
+        self.assertEqual(self.names('saw'), ['Saw'])
+        Product.objects.create(name='Sawhorse', category=self.category, price=1, quantity=1)
+        
+        with override_settings(AUTOCOMPLETE_REFRESH_SECONDS=0):
+            # Another request is refreshing it
+            with autocomplete._build_lock:
+                self.assertEqual(self.names('saw'), ['Saw'])
+            self.assertEqual(self.names('saw'), ['Saw', 'Sawhorse'])
+
 class ProductTests(TestCase):
     """Test the product API."""
 
@@ -183,6 +582,17 @@ class ProductTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
         self.assertEqual(Product.objects.count(), 1)
 
+    def test_update_stock_admin(self):
+        """Test that admin users can set the stock level."""
+        self.client.force_authenticate(user=self.admin_user)
+        res = self.client.post(
+            reverse('product-update-stock', args=[self.product.id]), {'quantity': 42}
+        )
+        
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 42)
+
     def test_low_stock_endpoint(self):
         """Test the low_stock endpoint."""
         # Update product to have low stock
@@ -248,6 +658,47 @@ class SaleTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(len(res.data['results']), 1)
         
+    def test_sales_keep_snapshot_after_renames(self):
+        """Test that the ledger shows product and seller names as they were at sale time."""
+        self.product.name = 'Renamed Product'
+        self.product.save()
+        self.admin_user.username = 'renamed'
+        self.admin_user.save()
+        
+        self.client.force_authenticate(user=self.admin_user)
+        sale = self.client.get(self.sale_url).data['results'][0]
+        
+        self.assertEqual(sale['product_name'], 'Test Product')
+        self.assertEqual(sale['created_by_username'], 'admin')
+        self.assertEqual(sale['category'], self.category.id)
+
+    def test_sale_product_cannot_change(self):
+        """Test that updating a sale keeps its product and the snapshot taken from it."""
+        other = Product.objects.create(
+            name='Other Product', category=Category.objects.create(name='Other'), price=Decimal('5.00'), quantity=10
+        )
+        self.client.force_authenticate(user=self.admin_user)
+        res = self.client.patch(self.sale_detail_url, {'product': other.id, 'quantity': 3})
+        
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.sale.refresh_from_db()
+        self.assertEqual(self.sale.product_id, self.product.id)
+        self.assertEqual(self.sale.product_name, 'Test Product')
+        self.assertEqual(self.sale.category_id, self.category.id)
+        self.assertEqual(self.sale.quantity, 3)
+
+    def test_list_sales_reads_one_table(self):
+        """Test that listing sales does not join products or users."""
+        self.client.force_authenticate(user=self.admin_user)
+        
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(self.sale_url)
+        
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        sale_queries = [q['sql'] for q in queries.captured_queries if 'FROM "api_sale"' in q['sql']]
+        self.assertTrue(sale_queries)
+        self.assertFalse(any('JOIN' in sql for sql in sale_queries))
+
     def test_list_sales_user_fails(self):
         """Test that regular users cannot list sales."""
         self.client.force_authenticate(user=self.user)
@@ -282,4 +733,1036 @@ class SaleTests(TestCase):
         res = self.client.post(self.sale_url, payload)
         
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertEqual(Sale.objects.count(), 1)
\ No newline at end of file
+        self.assertEqual(Sale.objects.count(), 1)
+
+class StockReservationTests(TestCase):
+    """Test the stock reservation API."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='ADMIN'
+        )
+        self.category = Category.objects.create(name='Test Category')
+        self.product = Product.objects.create(
+            name='Test Product',
+            category=self.category,
+            price=Decimal('10.00'),
+            quantity=10
+        )
+        self.client.force_authenticate(user=self.admin_user)
+        self.reserve_url = reverse('product-reserve', args=[self.product.id])
+
+    def test_reserve_reduces_available_stock(self):
+        """Test that a hold reduces available but not on-hand stock."""
+        res = self.client.post(self.reserve_url, {'quantity': 8})
+        
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 10)
+        self.assertEqual(self.product.available_quantity, 2)
+
+    def test_reserve_more_than_available_fails(self):
+        """Test that holds cannot exceed available stock."""
+        self.client.post(self.reserve_url, {'quantity': 8})
+        res = self.client.post(self.reserve_url, {'quantity': 3})
+        
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(StockReservation.objects.count(), 1)
+
+    def test_sale_respects_active_holds(self):
+        """Test that direct sales cannot take units held for another checkout."""
+        self.client.post(self.reserve_url, {'quantity': 8})
+        res = self.client.post(reverse('sale-list'), {
+            'product': self.product.id,
+            'quantity': 3,
+            'unit_price': '10.00'
+        })
+        
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sale_rechecks_stock_under_the_lock(self):
+        """Test that a sale validated before another checkout took the stock is refused when saved."""
+        request = RequestFactory().post('/')
+        request.user = self.admin_user
+        serializer = SaleSerializer(
+            data={'product': self.product.id, 'quantity': 6, 'unit_price': '10.00'},
+            context={'request': request},
+        )
+        self.assertTrue(serializer.is_valid())
+        # Another request holds units between this one's validation and its save
+        self.client.post(self.reserve_url, {'quantity': 5})
+        
+        with self.assertRaisesMessage(InsufficientStock, 'Only 5 units left.'):
+            serializer.save()
+        self.assertEqual(Sale.objects.count(), 0)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 10)
+
+    def test_confirm_keeps_other_holds(self):
+        """Test that confirming a hold cannot take units other active holds cover."""
+        first = self.client.post(self.reserve_url, {'quantity': 4}).data['id']
+        self.client.post(self.reserve_url, {'quantity': 6})
+        Product.objects.filter(pk=self.product.pk).update(quantity=8)
+        
+        res = self.client.post(reverse('reservation-confirm', args=[first]))
+        
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(StockReservation.objects.count(), 2)
+
+    def test_confirm_creates_sale(self):
+        """Test that confirming a hold records the sale and consumes the hold."""
+        reservation_id = self.client.post(self.reserve_url, {'quantity': 4}).data['id']
+        res = self.client.post(reverse('reservation-confirm', args=[reservation_id]))
+        
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertFalse(StockReservation.objects.exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 6)
+        
+        res = self.client.post(reverse('reservation-confirm', args=[reservation_id]))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_confirm_expired_fails(self):
+        """Test that an expired hold cannot be confirmed."""
+        reservation_id = self.client.post(self.reserve_url, {'quantity': 4}).data['id']
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        res = self.client.post(reverse('reservation-confirm', args=[reservation_id]))
+        
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Sale.objects.count(), 0)
+
+    def test_confirm_after_stock_correction_fails(self):
+        """Test that a hold larger than the corrected on-hand stock is kept and not sold."""
+        reservation_id = self.client.post(self.reserve_url, {'quantity': 8}).data['id']
+        Product.objects.filter(pk=self.product.pk).update(quantity=5)
+        res = self.client.post(reverse('reservation-confirm', args=[reservation_id]))
+        
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Sale.objects.count(), 0)
+        self.assertTrue(StockReservation.objects.filter(pk=reservation_id).exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 5)
+
+    def test_release_returns_stock(self):
+        """Test that releasing a hold frees the units."""
+        reservation_id = self.client.post(self.reserve_url, {'quantity': 10}).data['id']
+        res = self.client.post(reverse('reservation-release', args=[reservation_id]))
+        
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.product.available_quantity, 10)
+
+    def test_expire_reservations_command(self):
+        """Test that the sweeper deletes only expired holds."""
+        now = timezone.now()
+        for offset in (-60, -30, 60):
+            StockReservation.objects.create(
+                product=self.product,
+                quantity=1,
+                created_by=self.admin_user,
+                expires_at=now + timedelta(seconds=offset)
+            )
+        call_command('expire_reservations', batch_size=1, stdout=StringIO())
+        
+        self.assertEqual(StockReservation.objects.count(), 1)
+        self.assertEqual(self.product.available_quantity, 9)
+
+class SyncTests(TestCase):
+    """Test the delta sync API."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@example.com',
+            password='testpass123',
+            role='USER'
+        )
+        self.category = Category.objects.create(name='Test Category')
+        self.product = Product.objects.create(
+            name='Test Product',
+            category=self.category,
+            price=Decimal('10.00'),
+            quantity=10
+        )
+        # Pushing existing rows safely behind any cursor issued by the tests
+        earlier = timezone.now() - timedelta(minutes=10)
+        Category.objects.update(updated_at=earlier)
+        Product.objects.update(updated_at=earlier)
+        self.client.force_authenticate(user=self.user)
+        self.sync_url = reverse('sync')
+
+    def sync(self, since=None):
+        params = {'since': since} if since else {}
+        res = self.client.get(self.sync_url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return json.loads(b''.join(res.streaming_content))
+
+    def test_full_sync_without_cursor(self):
+        """Test that the first sync returns every row."""
+        data = self.sync()
+        
+        self.assertEqual([c['id'] for c in data['categories']], [self.category.id])
+        self.assertEqual([p['id'] for p in data['products']], [self.product.id])
+        self.assertIn('cursor', data)
+
+    def test_delta_sync_returns_only_changes(self):
+        """Test that rows untouched since the cursor are not sent again."""
+        cursor = self.sync()['cursor']
+        other = Product.objects.create(
+            name='Other Product',
+            category=self.category,
+            price=Decimal('5.00'),
+            quantity=1
+        )
+        
+        data = self.sync(cursor)
+        self.assertEqual(data['categories'], [])
+        self.assertEqual([p['id'] for p in data['products']], [other.id])
+
+    def test_delta_sync_reports_deletions(self):
+        """Test that hard deletes are reported as tombstones."""
+        cursor = self.sync()['cursor']
+        product_id = self.product.id
+        self.product.delete()
+        
+        data = self.sync(cursor)
+        self.assertEqual(data['deleted']['products'], [product_id])
+        self.assertEqual(Tombstone.objects.count(), 1)
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor is rejected."""
+        res = self.client.get(self.sync_url, {'since': 'yesterday'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        res = self.client.get(self.sync_url, {'since': '2026-13-45T00:00:00'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cursor_without_timezone(self):
+        """Test that a cursor without an offset is read in the server's time zone."""
+        since = timezone.localtime(timezone.now() - timedelta(minutes=5)).replace(tzinfo=None)
+        other = Product.objects.create(
+            name='Other Product',
+            category=self.category,
+            price=Decimal('5.00'),
+            quantity=1
+        )
+        
+        data = self.sync(since.isoformat())
+        self.assertEqual([p['id'] for p in data['products']], [other.id])
+        
+        old = since - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS)
+        res = self.client.get(self.sync_url, {'since': old.isoformat()})
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+
+    def test_cursor_overlaps_late_commits(self):
+        """Test that a row stamped just before the cursor but committed after the sync is sent next time."""
+        cursor = self.sync()['cursor']
+        # Stamped while the previous sync was reading, committed once it had finished
+        Product.objects.filter(pk=self.product.pk).update(updated_at=timezone.now() - timedelta(seconds=1))
+        
+        data = self.sync(cursor)
+        self.assertEqual([p['id'] for p in data['products']], [self.product.id])
+
+    def test_expired_cursor_requires_full_sync(self):
+        """Test that cursors older than the tombstone retention are refused."""
+        since = timezone.now() - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS, minutes=1)
+        res = self.client.get(self.sync_url, {'since': since.isoformat()})
+        
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+
+    def test_prune_tombstones_command(self):
+        """Test that only tombstones past the retention period are deleted."""
+        now = timezone.now()
+        for days in (settings.TOMBSTONE_RETENTION_DAYS + 1, settings.TOMBSTONE_RETENTION_DAYS + 2, 1):
+            Tombstone.objects.create(model_name='product', object_id=days, deleted_at=now - timedelta(days=days))
+        call_command('prune_tombstones', batch_size=1, stdout=StringIO())
+        
+        self.assertEqual(list(Tombstone.objects.values_list('object_id', flat=True)), [1])
+
+class BatchTests(TestCase):
+    """Test the batch request API."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='ADMIN'
+        )
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@example.com',
+            password='testpass123',
+            role='USER'
+        )
+        self.batch_url = reverse('batch')
+        self.operations = [
+            {'method': 'POST', 'path': '/api/categories/', 'body': {'name': 'Batch Category'}},
+            {'method': 'POST', 'path': '/api/products/', 'body': {
+                'name': 'Batch Product', 'category': '$0.id', 'price': '3.50', 'quantity': 4
+            }},
+            {'method': 'GET', 'path': '/api/products/$1.id/'},
+        ]
+
+    def test_batch_runs_dependent_operations(self):
+        """Test that later operations can use ids returned by earlier ones."""
+        self.client.force_authenticate(user=self.admin_user)
+        res = self.client.post(self.batch_url, {'operations': self.operations}, format='json')
+        
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['status'] for r in res.data['results']], [201, 201, 200])
+        self.assertEqual(res.data['results'][2]['body']['category_name'], 'Batch Category')
+
+    def test_atomic_batch_rolls_back_on_failure(self):
+        """Test that a failing operation undoes the whole atomic batch."""
+        self.client.force_authenticate(user=self.admin_user)
+        operations = self.operations[:1] + [
+            {'method': 'POST', 'path': '/api/products/', 'body': {'name': 'Missing fields'}}
+        ]
+        res = self.client.post(
+            self.batch_url, {'operations': operations, 'atomic': True}, format='json'
+        )
+        
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Category.objects.count(), 0)
+
+    def test_batch_reports_server_errors_per_operation(self):
+        """Test that an operation raising an error gets a 500 result instead of aborting the batch."""
+        self.client.force_authenticate(user=self.admin_user)
+        product = Product.objects.create(
+            name='Stocked', category=Category.objects.create(name='Existing'), price=Decimal('1.00'), quantity=3
+        )
+        for name, atomic in (('Kept', False), ('Rolled back', True)):
+            operations = [
+                {'method': 'POST', 'path': '/api/categories/', 'body': {'name': name}},
+                {'method': 'POST', 'path': f'/api/products/{product.id}/update_stock/', 'body': {'quantity': -1}},
+            ]
+            with self.assertLogs('api.views', 'ERROR'):
+                res = self.client.post(
+                    self.batch_url, {'operations': operations, 'atomic': atomic}, format='json'
+                )
+            
+            self.assertEqual(res.status_code, 400 if atomic else 200)
+            self.assertEqual([r['status'] for r in res.data['results']], [201, 500])
+            self.assertEqual(Category.objects.filter(name=name).exists(), not atomic)
+
+    def test_batch_applies_sub_request_permissions(self):
+        """Test that regular users cannot write through a batch."""
+        self.client.force_authenticate(user=self.user)
+        res = self.client.post(self.batch_url, {'operations': self.operations[:1]}, format='json')
+        
+        self.assertEqual(res.data['results'][0]['status'], status.HTTP_403_FORBIDDEN)
+        self.assertEqual(Category.objects.count(), 0)
+
+    def test_batch_rejects_other_routes(self):
+        """Test that only catalog and sales routes can be batched."""
+        self.client.force_authenticate(user=self.admin_user)
+        operations = [{'method': 'GET', 'path': '/api/users/me/'}]
+        res = self.client.post(self.batch_url, {'operations': operations}, format='json')
+        
+        self.assertEqual(res.data['results'][0]['status'], status.HTTP_404_NOT_FOUND)
+
+@override_settings(REPLICA_DATABASES=['replica1'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """Test read-replica routing and read-your-writes stickiness."""
+    # Not TestCase: its wrapping transaction would keep every read on the primary
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='ADMIN'
+        )
+        self.category = Category.objects.create(name='Test Category')
+
+    def tearDown(self):
+        disable_replica_reads()
+        cache.clear()
+
+    def test_reads_use_primary_by_default(self):
+        """Test that reads outside replica-enabled views stay on the primary."""
+        self.assertEqual(router.db_for_read(Product), 'default')
+
+    def test_replica_reads(self):
+        """Test that enabled replica reads go to a replica and writes never do."""
+        enable_replica_reads()
+        
+        self.assertEqual(router.db_for_read(Product), 'replica1')
+        self.assertEqual(router.db_for_write(Product), 'default')
+
+    def test_write_pins_user_to_primary(self):
+        """Test that a successful write keeps the user on the primary."""
+        self.client.force_authenticate(user=self.admin_user)
+        request = RequestFactory().get('/')
+        request.user = self.admin_user
+        self.assertFalse(is_pinned_to_primary(request))
+        
+        res = self.client.post(reverse('category-list'), {'name': 'New Category'})
+        
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        request.COOKIES = {PIN_COOKIE: res.cookies[PIN_COOKIE].value}
+        self.assertTrue(is_pinned_to_primary(request))
+        # The pin comes back with the client, so it holds whichever worker serves the read
+        cache.clear()
+        res = self.client.get(reverse('category-list'))
+        self.assertEqual(res.data['count'], 2)
+
+    def use_stale_replica(self):
+        # A copy of the primary taken now, which later writes never reach
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        name = os.path.join(directory.name, 'stale.sqlite3')
+        connection.ensure_connection()
+        target = sqlite3.connect(name)
+        connection.connection.backup(target)
+        target.close()
+        connections.settings['stale_replica'] = {**connection.settings_dict, 'NAME': name}
+        self.addCleanup(connections.settings.pop, 'stale_replica')
+        self.addCleanup(connections.__delitem__, 'stale_replica')
+        self.addCleanup(lambda: connections['stale_replica'].close())
+
+    @override_settings(REPLICA_DATABASES=['stale_replica'])
+    def test_batch_reads_see_earlier_writes(self):
+        """Test that reads in a batch after a write go to the primary, atomic or not."""
+        self.use_stale_replica()
+        
+        for atomic in (False, True):
+            client = APIClient()
+            client.force_authenticate(user=self.admin_user)
+            operations = [
+                {'method': 'POST', 'path': '/api/categories/', 'body': {'name': f'Batch {atomic}'}},
+                {'method': 'GET', 'path': '/api/categories/$0.id/'},
+            ]
+            res = client.post(reverse('batch'), {'operations': operations, 'atomic': atomic}, format='json')
+            
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual([result['status'] for result in res.data['results']], [201, 200])
+            self.assertEqual(res.data['results'][1]['body']['name'], f'Batch {atomic}')
+        
+        # Without a pin, reads do go to the replica, which has not seen the new category
+        client = APIClient()
+        client.force_authenticate(user=self.admin_user)
+        category = Category.objects.get(name='Batch False')
+        self.assertEqual(
+            client.get(reverse('category-detail', args=[category.id])).status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+
+    def test_pin_belongs_to_the_writer(self):
+        """Test that a pin issued to one user does not pin another."""
+        other = User.objects.create_user(username='other', email='other@example.com', password='testpass123')
+        self.client.force_authenticate(user=self.admin_user)
+        res = self.client.post(reverse('category-list'), {'name': 'New Category'})
+        request = RequestFactory().get('/', HTTP_COOKIE=f'{PIN_COOKIE}={res.cookies[PIN_COOKIE].value}')
+        
+        request.user = other
+        self.assertFalse(is_pinned_to_primary(request))
+        request.user = self.admin_user
+        self.assertTrue(is_pinned_to_primary(request))
+
+class SQLiteProductionProfileTests(SimpleTestCase):
+    """Test the tuned SQLite backend."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.wrapper = ProductionSQLiteWrapper({
+            **connection.settings_dict,
+            'ENGINE': 'backend.sqlite',
+            'NAME': os.path.join(directory.name, 'profile.sqlite3'),
+            'OPTIONS': {
+                'pragmas': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 1234},
+                'write_queue': True,
+            },
+        }, alias='sqlite_profile')
+        self.addCleanup(self.wrapper.close)
+
+    def test_pragmas_applied_on_connect(self):
+        """Test that configured pragmas are set on each new connection."""
+        with self.wrapper.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 1234)
+
+    def test_write_lock_released_after_commit(self):
+        """Test that the in-process write queue is held only for the transaction."""
+        self.wrapper.ensure_connection()
+        self.wrapper._start_transaction_under_autocommit()
+        self.assertTrue(self.wrapper.holds_write_lock)
+        
+        self.wrapper.commit()
+        self.assertFalse(self.wrapper.holds_write_lock)
+
+    def test_write_queue_is_per_file(self):
+        """Test that one thread can hold write transactions on two database files at once."""
+        directory = os.path.dirname(self.wrapper.settings_dict['NAME'])
+        held = []
+        
+        def hold_both():
+            wrappers = [
+                ProductionSQLiteWrapper({**self.wrapper.settings_dict, 'NAME': os.path.join(directory, name)}, alias=name)
+                for name in ('first.sqlite3', 'second.sqlite3')
+            ]
+            try:
+                for wrapper in wrappers:
+                    wrapper.ensure_connection()
+                    wrapper._start_transaction_under_autocommit()
+                held.extend(wrapper.holds_write_lock for wrapper in wrappers)
+            finally:
+                for wrapper in wrappers:
+                    wrapper.close()
+        # A daemon thread, so a deadlock fails the test instead of hanging the run
+        worker = threading.Thread(target=hold_both, daemon=True)
+        worker.start()
+        worker.join(5)
+        
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(held, [True, True])
+
+    def test_read_only_connections_skip_the_write_queue(self):
+        """Test that replica connections neither queue for nor take write locks."""
+        replica = ProductionSQLiteWrapper({
+            **self.wrapper.settings_dict,
+            'OPTIONS': {**self.wrapper.settings_dict['OPTIONS'], 'read_only': True},
+        }, alias='sqlite_replica')
+        self.addCleanup(replica.close)
+        replica.ensure_connection()
+        
+        replica._start_transaction_under_autocommit()
+        self.assertFalse(replica.holds_write_lock)
+        self.assertRaises(OperationalError, replica.cursor().execute, 'CREATE TABLE t (x)')
+        replica.rollback()
+
+SQLITE_REPLICA_SETTINGS = """
+import os
+from backend import settings
+replica = settings.DATABASES['replica1']
+print(replica['ENGINE'], os.path.basename(replica['NAME']), repr(replica['HOST']), replica['OPTIONS']['read_only'])
+"""
+
+class SQLiteReplicaSettingsTests(SimpleTestCase):
+    """Test replica settings built under the SQLite production profile."""
+
+    def test_replicas_open_their_own_files(self):
+        """Test that replicas point NAME at the replica file when SQLITE_PRODUCTION is on."""
+        env = {
+            **os.environ, 'DJANGO_LOAD_DOTENV': 'False', 'SQLITE_PRODUCTION': 'True',
+            'DB_ENGINE': 'django.db.backends.sqlite3', 'DB_REPLICAS': 'replica.sqlite3',
+        }
+        output = subprocess.run(
+            [sys.executable, '-c', SQLITE_REPLICA_SETTINGS], cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True, check=True,
+        ).stdout.split()
+        
+        self.assertEqual(output, ['backend.sqlite', 'replica.sqlite3', "''", 'True'])
+
+LEAN_WORKER = """
+import sys
+from backend.wsgi_api import application
+from django.apps import apps
+from django.test import Client
+client = Client(HTTP_HOST='localhost')
+print(client.get('/api/products/').status_code, client.get('/admin/').status_code)
+print(apps.is_installed('django.contrib.admin'), 'numpy' in sys.modules, 'dotenv' in sys.modules)
+"""
+
+class LeanSettingsProfileTests(SimpleTestCase):
+    """Test the API-only settings profile in a fresh interpreter."""
+
+    def test_lean_worker_serves_api_only(self):
+        """Test that the lean worker serves the API without the admin, NumPy or .env."""
+        env = {key: value for key, value in os.environ.items() if key != 'DJANGO_SETTINGS_MODULE'}
+        output = subprocess.run(
+            [sys.executable, '-c', LEAN_WORKER], cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True, check=True,
+        ).stdout.split()
+        
+        self.assertEqual(output, ['401', '404', 'False', 'False', 'False'])
+
+class SaleArchiveTests(TestCase):
+    """Test archiving closed periods out of the sales table."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='ADMIN'
+        )
+        self.category = Category.objects.create(name='Test Category')
+        self.product = Product.objects.create(
+            name='Test Product',
+            category=self.category,
+            price=Decimal('10.00'),
+            quantity=10
+        )
+        for sale_date in ('2024-01-15T10:00:00Z', '2024-02-15T10:00:00Z'):
+            Sale.objects.create(
+                product=self.product,
+                quantity=1,
+                unit_price=self.product.price,
+                sale_date=sale_date,
+                created_by=self.admin_user
+            )
+        self.recent_sale = Sale.objects.create(
+            product=self.product,
+            quantity=1,
+            unit_price=self.product.price,
+            created_by=self.admin_user
+        )
+        call_command('archive_sales', before='2024-02', batch_size=1, stdout=StringIO())
+        self.client.force_authenticate(user=self.admin_user)
+        self.sale_url = reverse('sale-list')
+
+    def test_archive_moves_closed_periods(self):
+        """Test that only sales before the cutoff are moved, without touching stock."""
+        self.assertEqual(ArchivedSale.objects.count(), 1)
+        self.assertEqual(Sale.objects.count(), 2)
+        self.assertEqual(sale_history('id').count(), 3)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 7)
+
+    def test_archive_refuses_open_months(self):
+        """Test that the cutoff cannot be later than the start of the current month."""
+        now = timezone.localtime()
+        next_month = (now.replace(day=28) + timedelta(days=4)).strftime('%Y-%m')
+        with self.assertRaises(CommandError):
+            call_command('archive_sales', before=next_month, stdout=StringIO())
+        self.assertEqual(Sale.objects.count(), 2)
+        
+        call_command('archive_sales', before=now.strftime('%Y-%m'), stdout=StringIO())
+        self.assertEqual(ArchivedSale.objects.count(), 2)
+
+    def test_default_listing_reads_hot_table(self):
+        """Test that the sales list only shows sales still in the hot table."""
+        res = self.client.get(self.sale_url)
+        
+        self.assertEqual(res.data['count'], 2)
+        self.assertEqual(res.data['results'][0]['id'], self.recent_sale.id)
+
+    def test_date_range_reaches_archive(self):
+        """Test that a date range covering archived months includes them."""
+        res = self.client.get(self.sale_url, {'sale_date_before': '2024-03-01T00:00:00Z'})
+        
+        self.assertEqual(res.data['count'], 2)
+        self.assertEqual([r['archived'] for r in res.data['results']], [False, True])
+        self.assertEqual(res.data['results'][1]['product_name'], self.product.name)
+
+    def test_include_archived(self):
+        """Test that the full history can be listed explicitly."""
+        res = self.client.get(self.sale_url, {'include_archived': 'true'})
+        
+        self.assertEqual(res.data['count'], 3)
+
+class ReorderSuggestionTests(TestCase):
+    """Test demand forecasting and reorder suggestions."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='ADMIN'
+        )
+        self.category = Category.objects.create(name='Test Category')
+        self.fast = Product.objects.create(
+            name='Fast Seller', category=self.category, price=Decimal('1.00'), quantity=100
+        )
+        self.slow = Product.objects.create(
+            name='Slow Seller', category=self.category, price=Decimal('1.00'), quantity=100
+        )
+        today = timezone.now().replace(hour=12)
+        for day in range(1, 31):
+            Sale.objects.create(
+                product=self.fast,
+                quantity=3,
+                unit_price=self.fast.price,
+                sale_date=today - timedelta(days=day),
+                created_by=self.admin_user
+            )
+        self.fast.refresh_from_db()
+        self.url = reverse('product-reorder-suggestions')
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_compute_suggestions(self):
+        """Test forecasts on a steady seller and a product without sales."""
+        result = compute_suggestions(
+            np.array([1, 2]), np.array([20.0, 20.0]),
+            np.full(30, 1), np.arange(30), np.full(30, 2.0),
+            days=30, window=30, lead_time=7, cover_days=30
+        )
+        
+        self.assertAlmostEqual(result['velocity'][0], 2.0)
+        self.assertAlmostEqual(result['forecast'][0], 2.0, places=3)
+        self.assertAlmostEqual(result['days_until_stockout'][0], 10.0, places=2)
+        self.assertEqual(result['reorder_quantity'][0], 0)
+        self.assertEqual(result['days_until_stockout'][1], np.inf)
+        self.assertEqual(result['reorder_quantity'][1], 0)
+
+    def test_reorder_suggestions_endpoint(self):
+        """Test that only products about to run out are suggested."""
+        self.client.force_authenticate(user=self.admin_user)
+        res = self.client.get(self.url)
+        
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['product'] for r in res.data['results']], [self.fast.id])
+        self.assertAlmostEqual(res.data['results'][0]['daily_velocity'], 3.0)
+        self.assertGreater(res.data['results'][0]['reorder_quantity'], 0)
+
+    def test_new_sale_invalidates_cache(self):
+        """Test that a new sale recomputes the cached suggestions."""
+        self.client.force_authenticate(user=self.admin_user)
+        self.assertEqual(self.client.get(self.url).data['count'], 1)
+        
+        Sale.objects.create(
+            product=self.slow,
+            quantity=99,
+            unit_price=self.slow.price,
+            sale_date=timezone.now() - timedelta(days=1),
+            created_by=self.admin_user
+        )
+        self.assertEqual(self.client.get(self.url).data['count'], 2)
+
+    def test_result_computed_before_a_sale_is_not_kept(self):
+        """Test that suggestions another worker computed before a sale committed are never served."""
+        self.client.force_authenticate(user=self.admin_user)
+        version, _ = caching.get(forecasting.CACHE_KEY)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Sale.objects.create(
+                product=self.slow,
+                quantity=99,
+                unit_price=self.slow.price,
+                sale_date=timezone.now() - timedelta(days=1),
+                created_by=self.admin_user
+            )
+        # The other worker finishes and stores what it read before the sale
+        caching.set(forecasting.CACHE_KEY, version, [], 3600)
+        
+        self.assertEqual(self.client.get(self.url).data['count'], 2)
+
+@task('test_flaky')
+def flaky_task(job):
+    if job.payload.get('fail'):
+        raise RuntimeError('boom')
+
+@task('test_vanishing')
+def vanishing_task(job):
+    # Leaves the runner nothing to save the result to
+    Job.objects.filter(id=job.id).delete()
+
+class JobQueueTests(TestCase):
+    """Test the database-backed job queue."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Test Category')
+
+    def test_enqueue_after_commit_with_dedup(self):
+        """Test that jobs are inserted on commit and duplicates are absorbed."""
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('test_flaky', dedup_key='same')
+            enqueue('test_flaky', dedup_key='same')
+            enqueue('test_flaky')
+            self.assertEqual(Job.objects.count(), 0)
+        
+        self.assertEqual(Job.objects.count(), 2)
+
+    def test_failed_job_retries_with_backoff(self):
+        """Test that a failing job is rescheduled and finally marked failed."""
+        job = Job.objects.create(name='test_flaky', payload={'fail': True}, max_attempts=2)
+        
+        self.assertEqual(claim_jobs(10), [job.id])
+        with self.assertLogs('api.jobs', 'WARNING'):
+            self.assertEqual(run_job(job.id), Job.Status.PENDING)
+        job.refresh_from_db()
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('boom', job.last_error)
+        self.assertEqual(claim_jobs(10), [])
+        
+        Job.objects.update(run_at=timezone.now())
+        claim_jobs(10)
+        with self.assertLogs('api.jobs', 'WARNING'):
+            self.assertEqual(run_job(job.id), Job.Status.FAILED)
+
+    def test_deleted_job_is_skipped(self):
+        """Test that a claimed job deleted before it runs is logged and skipped."""
+        job = Job.objects.create(name='test_flaky')
+        claim_jobs(10)
+        job.delete()
+        
+        with self.assertLogs('api.jobs', 'WARNING'):
+            self.assertIsNone(run_job(job.id))
+
+    def test_stale_jobs_requeued_or_failed(self):
+        """Test that lost jobs are retried unless they were on their last attempt."""
+        locked_at = timezone.now() - timedelta(seconds=settings.JOB_LOCK_TIMEOUT + 1)
+        retry = Job.objects.create(name='test_flaky', status=Job.Status.RUNNING, attempts=1, max_attempts=2, locked_at=locked_at)
+        last = Job.objects.create(name='test_flaky', status=Job.Status.RUNNING, attempts=2, max_attempts=2, locked_at=locked_at)
+        
+        self.assertEqual(requeue_stale_jobs(), 2)
+        retry.refresh_from_db()
+        last.refresh_from_db()
+        self.assertEqual(retry.status, Job.Status.PENDING)
+        self.assertEqual(last.status, Job.Status.FAILED)
+        self.assertIsNotNone(last.finished_at)
+
+    def test_low_stock_events_coalesce(self):
+        """Test that several products going low queue a single digest."""
+        with self.captureOnCommitCallbacks(execute=True):
+            for name in ('A', 'B', 'C'):
+                Product.objects.create(
+                    name=name, category=self.category, price=Decimal('1.00'), quantity=1
+                )
+        
+        self.assertEqual(Job.objects.filter(name='low_stock_digest').count(), 1)
+        
+        Job.objects.update(run_at=timezone.now())
+        job_id, = claim_jobs(10)
+        with self.assertLogs('api.tasks', 'WARNING') as logs:
+            self.assertEqual(run_job(job_id), Job.Status.DONE)
+        self.assertIn('Low stock on 3 products', logs.output[0])
+
+    def test_low_stock_digest_covers_previous_run(self):
+        """Test that a product going low while the previous digest ran is in the next one."""
+        now = timezone.now()
+        Job.objects.create(
+            name='low_stock_digest', status=Job.Status.DONE,
+            locked_at=now - timedelta(minutes=10), finished_at=now - timedelta(minutes=1)
+        )
+        for name, updated in (('During', now - timedelta(minutes=5)), ('Before', now - timedelta(minutes=20))):
+            product = Product.objects.create(
+                name=name, category=self.category, price=Decimal('1.00'), quantity=1
+            )
+            Product.objects.filter(pk=product.pk).update(updated_at=updated)
+        
+        job = Job.objects.create(name='low_stock_digest')
+        claim_jobs(10)
+        with self.assertLogs('api.tasks', 'WARNING') as logs:
+            self.assertEqual(run_job(job.id), Job.Status.DONE)
+        self.assertIn('Low stock on 1 products', logs.output[0])
+        self.assertIn('During: 1 left', logs.output[0])
+
+class RunWorkerTests(TransactionTestCase):
+    """Test the run_worker command."""
+
+    def test_burst_runs_due_jobs(self):
+        """Test that a burst worker drains the queue and exits."""
+        Job.objects.bulk_create(Job(name='test_flaky') for _ in range(5))
+        call_command('run_worker', burst=True, workers=2, stdout=StringIO())
+        
+        self.assertEqual(Job.objects.filter(status=Job.Status.DONE).count(), 5)
+
+    def test_worker_survives_runner_errors(self):
+        """Test that a job the runner cannot save is logged without stopping the worker."""
+        Job.objects.create(name='test_vanishing')
+        Job.objects.bulk_create(Job(name='test_flaky') for _ in range(3))
+        with self.assertLogs('api.jobs', 'ERROR'):
+            call_command('run_worker', burst=True, workers=1, stdout=StringIO())
+        
+        self.assertEqual(Job.objects.filter(status=Job.Status.DONE).count(), 3)
+
+class AdminChangelistTests(TestCase):
+    """Test that admin changelists run a fixed number of queries."""
+
+    def setUp(self):
+        self.superuser = User.objects.create_superuser(
+            username='root',
+            email='root@example.com',
+            password='testpass123'
+        )
+        self.client.force_login(self.superuser)
+        self.add_rows(3)
+
+    def add_rows(self, count):
+        offset = Category.objects.count()
+        for i in range(offset, offset + count):
+            category = Category.objects.create(name=f'Category {i}')
+            seller = User.objects.create_user(
+                username=f'seller{i}', email=f'seller{i}@example.com', password='testpass123'
+            )
+            product = Product.objects.create(
+                name=f'Product {i}', category=category, price=Decimal('2.00'), quantity=i + 10
+            )
+            Sale.objects.create(product=product, quantity=1, unit_price=product.price, created_by=seller)
+            StockReservation.objects.create(
+                product=product, quantity=1, created_by=seller,
+                expires_at=timezone.now() + timedelta(minutes=5)
+            )
+
+    def assertConstantQueries(self, url):
+        with CaptureQueriesContext(connection) as before:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.add_rows(5)
+        with CaptureQueriesContext(connection) as after:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(len(before), len(after), [q['sql'] for q in after.captured_queries])
+
+    def test_category_changelist_queries(self):
+        """Test the category changelist."""
+        self.assertConstantQueries(reverse('admin:api_category_changelist'))
+
+    def test_product_changelist_queries(self):
+        """Test the product changelist."""
+        self.assertConstantQueries(reverse('admin:api_product_changelist'))
+
+    def test_sale_changelist_queries(self):
+        """Test the sale changelist."""
+        self.assertConstantQueries(reverse('admin:api_sale_changelist'))
+
+    def test_reservation_changelist_queries(self):
+        """Test the stock reservation changelist."""
+        self.assertConstantQueries(reverse('admin:api_stockreservation_changelist'))
+
+    def test_estimated_count_on_large_tables(self):
+        """Test that an unfiltered changelist over the count limit is not fully counted."""
+        with override_settings(ADMIN_COUNT_LIMIT=2):
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.get(reverse('admin:api_product_changelist'))
+        
+        self.assertEqual(res.context['cl'].result_count, 3)
+        self.assertFalse(any('COUNT(' in q['sql'] for q in queries.captured_queries))
+
+    def test_adjust_stock_action(self):
+        """Test that the bulk action adds to the stock of the selected products."""
+        products = list(Product.objects.order_by('id')[:2])
+        res = self.client.post(reverse('admin:api_product_changelist'), {
+            'action': 'adjust_stock',
+            'index': 0,
+            '_selected_action': [p.id for p in products],
+            'mode': 'add',
+            'quantity': 10,
+            'apply': 'Apply',
+        })
+        
+        self.assertEqual(res.status_code, 302)
+        for product in products:
+            before = product.quantity
+            product.refresh_from_db()
+            self.assertEqual(product.quantity, before + 10)
+            movement = product.stock_movements.latest('id')
+            self.assertEqual((movement.quantity_change, movement.quantity_after), (10, before + 10))
+
+    def test_adjust_stock_keeps_reserved_units(self):
+        """Test that stock cannot be set below the units held by active reservations."""
+        product = Product.objects.order_by('id').first()
+        StockReservation.objects.create(
+            product=product, quantity=4, created_by=self.superuser,
+            expires_at=timezone.now() + timedelta(minutes=5)
+        )
+        data = {
+            'action': 'adjust_stock',
+            'index': 0,
+            '_selected_action': [product.id],
+            'mode': 'set',
+            'quantity': 3,
+            'apply': 'Apply',
+        }
+        
+        res = self.client.post(reverse('admin:api_product_changelist'), data, follow=True)
+        self.assertContains(res, 'Stock was not adjusted')
+        self.assertEqual(Product.objects.get(pk=product.pk).quantity, product.quantity)
+        
+        # Four units held here plus one by the seller's hold from setUp
+        self.client.post(reverse('admin:api_product_changelist'), {**data, 'quantity': 5})
+        self.assertEqual(Product.objects.get(pk=product.pk).quantity, 5)
+
+    def test_export_csv_action(self):
+        """Test that selected sales are exported as CSV."""
+        res = self.client.post(reverse('admin:api_sale_changelist'), {
+            'action': 'export',
+            'index': 0,
+            '_selected_action': list(Sale.objects.values_list('id', flat=True)),
+        })
+        
+        rows = b''.join(res.streaming_content).decode().splitlines()
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        self.assertEqual(len(rows), 4)
+        self.assertTrue(rows[0].startswith('id,product_id,product_name,category_id'))
+
+class CompressionTests(TestCase):
+    """Test negotiated response compression."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@example.com',
+            password='testpass123',
+            role='USER'
+        )
+        self.client.force_authenticate(user=self.user)
+        category = Category.objects.create(name='Test Category')
+        for i in range(10):
+            Product.objects.create(
+                name=f'Product {i}', category=category, price=Decimal('1.00'), quantity=10,
+                description='A product description long enough to be worth compressing.'
+            )
+
+    def test_negotiate(self):
+        """Test that the best acceptable encoding is chosen."""
+        self.assertEqual(negotiate('gzip, deflate'), 'gzip')
+        self.assertEqual(negotiate('deflate;q=1, gzip;q=0.5'), 'gzip')
+        self.assertEqual(negotiate('*'), negotiate('br, gzip'))
+        self.assertIsNone(negotiate('gzip;q=0'))
+        self.assertIsNone(negotiate('*;q=0'))
+        self.assertIsNone(negotiate(''))
+
+    def test_json_is_compressed(self):
+        """Test that a product page is gzipped when the client accepts it."""
+        plain = self.client.get(reverse('product-list'))
+        res = self.client.get(reverse('product-list'), HTTP_ACCEPT_ENCODING='gzip')
+        
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res['Vary'])
+        self.assertEqual(int(res['Content-Length']), len(res.content))
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+
+    def test_identity_without_accept_encoding(self):
+        """Test that clients that do not ask for compression get the plain body."""
+        res = self.client.get(reverse('product-list'))
+        
+        self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', res['Vary'])
+
+    def test_small_responses_are_not_compressed(self):
+        """Test that bodies below COMPRESSION_MIN_SIZE are sent as is."""
+        with override_settings(COMPRESSION_MIN_SIZE=100000):
+            res = self.client.get(reverse('product-list'), HTTP_ACCEPT_ENCODING='gzip')
+        
+        self.assertFalse(res.has_header('Content-Encoding'))
+
+    def test_streaming_response_is_compressed(self):
+        """Test that the streamed sync feed is compressed as one gzip stream."""
+        res = self.client.get(reverse('sync'), HTTP_ACCEPT_ENCODING='gzip')
+        
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertFalse(res.has_header('Content-Length'))
+        body = json.loads(gzip.decompress(b''.join(res.streaming_content)))
+        self.assertEqual(len(body['products']), 10)
+
+    def test_skipped_responses(self):
+        """Test that 304s, unlisted content types and encoded bodies are left alone."""
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        responses = [
+            HttpResponse(status=304, content_type='application/json'),
+            HttpResponse(b'x' * 5000, content_type='image/png'),
+            HttpResponse(b'x' * 5000, content_type='text/html'),
+            HttpResponse(b'x' * 5000, content_type='application/json', headers={'Content-Encoding': 'br'}),
+        ]
+        
+        for response in responses:
+            result = CompressionMiddleware(lambda request: response)(request)
+            self.assertNotEqual(result.get('Content-Encoding'), 'gzip')
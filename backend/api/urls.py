@@ -1,13 +1,25 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CategoryViewSet, ProductViewSet, SaleViewSet
+from .views import (
+    CategoryViewSet,
+    ProductViewSet,
+    SaleViewSet,
+    StockReservationViewSet,
+    SyncView,
+    BatchView,
+    ValuationView,
+)
 
 # Creating a router and registering our viewsets with it
 router = DefaultRouter()
 router.register(r'categories', CategoryViewSet)
 router.register(r'products', ProductViewSet)
 router.register(r'sales', SaleViewSet)
+router.register(r'reservations', StockReservationViewSet, basename='reservation')
 
 urlpatterns = [
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('batch/', BatchView.as_view(), name='batch'),
+    path('reports/valuation/', ValuationView.as_view(), name='inventory-valuation'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,20 +1,75 @@
-from rest_framework import viewsets, filters, status
+from rest_framework import viewsets, filters, status, permissions
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+from django_filters import utils as filter_utils
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Category, Product, Sale
+from .models import (
+    ArchivedSale,
+    Category,
+    InsufficientStock,
+    Product,
+    Sale,
+    StockReservation,
+    Tombstone,
+)
 from .serializers import (
     CategorySerializer,
+    CategoryWithStatsSerializer,
     ProductSerializer,
     ProductListSerializer,
     SaleSerializer,
+    SaleHistorySerializer,
+    StockReservationSerializer,
+    ReserveStockSerializer,
+    BatchSerializer,
+    InventoryValuationSerializer,
 )
+from . import autocomplete, forecasting, reports
 from .permissions import IsAdminUser, IsAdminOrReadOnly
+from backend.db_routers import (
+    enable_replica_reads,
+    disable_replica_reads,
+    is_pinned_to_primary,
+)
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router, transaction
+from django.db.models import BooleanField, Value
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import StreamingHttpResponse
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO
 import django_filters
+import json
+import logging
+import re
 
+logger = logging.getLogger(__name__)
 
-class CategoryViewSet(viewsets.ModelViewSet):
+
+class ReplicaReadMixin:
+    # Lets safe requests read from a replica unless the user has just written
+    
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in permissions.SAFE_METHODS and not is_pinned_to_primary(request):
+            enable_replica_reads()
+    
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            disable_replica_reads()
+
+
+class CategoryViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
@@ -22,6 +77,24 @@ class CategoryViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'description']
     ordering_fields = ['name', 'created_at']
+    
+    def include_stats(self):
+        # ?stats=true adds product counts, stock value and recent revenue to reads
+        return (
+            self.action in ('list', 'retrieve')
+            and self.request.query_params.get('stats', '').lower() in ('1', 'true')
+        )
+    
+    def get_serializer_class(self):
+        if self.include_stats():
+            return CategoryWithStatsSerializer
+        return CategorySerializer
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.include_stats():
+            context['category_stats'] = reports.category_stats()
+        return context
 
 
 class ProductFilter(django_filters.FilterSet):
@@ -38,7 +111,7 @@ class ProductFilter(django_filters.FilterSet):
         else:  # If is_low_stock=False
             return queryset.filter(quantity__gt=threshold)
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     
     queryset = Product.objects.all()
     permission_classes = [IsAdminOrReadOnly]
@@ -67,12 +140,37 @@ class ProductViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(products, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        # Prefix matches on product names from the in-process index, without a database query
+        max_results = getattr(settings, 'AUTOCOMPLETE_MAX_RESULTS', 10)
+        try:
+            limit = int(request.query_params.get('limit', max_results))
+        except ValueError:
+            return Response(
+                {"limit": "Must be an integer."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        query = request.query_params.get('q', '')
+        return Response(autocomplete.search(query, min(limit, max_results)))
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def reorder_suggestions(self, request):
+        # Listing products forecast to run out, soonest first
+        suggestions = forecasting.reorder_suggestions()
+        page = self.paginate_queryset(suggestions)
+        
+        if page is not None:
+            return self.get_paginated_response(page)
+        
+        return Response(suggestions)
+    
     @action(detail=True, methods=['post'])
     def update_stock(self, request, pk=None):
         # Updating product stock quantity
         product = self.get_object()
         
-        console.log("IsAdmin:", request.user.is_admin,)
         # Check if user is admin
         if not request.user.is_admin:
             return Response(
@@ -95,11 +193,61 @@ class ProductViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        product.quantity = quantity
-        product.save()
+        with transaction.atomic():
+            product = Product.objects.select_for_update().get(pk=product.pk)
+            product.quantity = quantity
+            product.save()
         
         serializer = self.get_serializer(product)
         return Response(serializer.data)
+    
+    @action(detail=True, methods=['post'])
+    def reserve(self, request, pk=None):
+        # Holding stock for a checkout so it cannot be sold to anyone else
+        product = self.get_object()
+        
+        serializer = ReserveStockSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        quantity = serializer.validated_data['quantity']
+        ttl = serializer.validated_data.get(
+            'ttl', getattr(settings, 'RESERVATION_TTL', 900)
+        )
+        
+        with transaction.atomic():
+            # Locking the product row serializes concurrent holds on it
+            product = Product.objects.select_for_update().get(pk=product.pk)
+            available = product.available_quantity
+            
+            if available < quantity:
+                return Response(
+                    {"detail": f"Not enough stock available. Only {available} units left."},
+                    status=status.HTTP_409_CONFLICT
+                )
+            
+            reservation = StockReservation.objects.create(
+                product=product,
+                quantity=quantity,
+                created_by=request.user,
+                expires_at=timezone.now() + timedelta(seconds=ttl),
+            )
+        
+        return Response(
+            StockReservationSerializer(reservation).data,
+            status=status.HTTP_201_CREATED
+        )
+
+class SaleFilter(django_filters.FilterSet):
+    # Adds sale_date_after / sale_date_before
+    sale_date = django_filters.IsoDateTimeFromToRangeFilter()
+    include_archived = django_filters.BooleanFilter(method='filter_include_archived')
+    
+    class Meta:
+        model = Sale
+        fields = ['product', 'created_by', 'sale_date']
+    
+    def filter_include_archived(self, queryset, name, value):
+        # Handled by SaleViewSet when choosing which tables to read
+        return queryset
 
 class SaleViewSet(viewsets.ModelViewSet):
     
@@ -107,8 +255,328 @@ class SaleViewSet(viewsets.ModelViewSet):
     serializer_class = SaleSerializer
     permission_classes = [IsAdminUser]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
-    filterset_fields = ['product', 'created_by']
+    filterset_class = SaleFilter
     ordering_fields = ['sale_date', 'quantity', 'total_price']
+    ordering = ['-sale_date', '-id']
+    
+    history_fields = [
+        'id', 'product', 'product_name', 'category', 'quantity', 'unit_price',
+        'total_price', 'sale_date', 'created_by', 'created_by_username',
+    ]
+    
+    def get_queryset(self):
+        # Sales carry their own product and seller snapshot, so listings read one table
+        return Sale.objects.all()
+    
+    def reaches_archive(self):
+        # Only listings that ask for old dates pay for reading the archive table
+        if self.action != 'list':
+            return False
+        if not hasattr(self, '_reaches_archive'):
+            filterset = SaleFilter(self.request.query_params, queryset=ArchivedSale.objects.all(), request=self.request)
+            params = filterset.form.data
+            if not filterset.is_valid():
+                self._reaches_archive = False
+            elif filterset.form.cleaned_data.get('include_archived'):
+                self._reaches_archive = True
+            elif params.get('sale_date_after') or params.get('sale_date_before'):
+                self._reaches_archive = filterset.qs.exists()
+            else:
+                self._reaches_archive = False
+        return self._reaches_archive
+    
+    def get_serializer_class(self):
+        if self.reaches_archive():
+            return SaleHistorySerializer
+        return SaleSerializer
+    
+    def perform_create(self, serializer):
+        # Stock can change between validation and the locked save; answered like the validation
+        try:
+            serializer.save()
+        except InsufficientStock as exc:
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [str(exc)]})
+    
+    def filter_queryset(self, queryset):
+        if not self.reaches_archive():
+            return super().filter_queryset(queryset)
+        
+        # Filtering each table before the union, then ordering the combined rows
+        parts = []
+        for model, archived in ((Sale, False), (ArchivedSale, True)):
+            filterset = SaleFilter(self.request.query_params, queryset=model.objects.all(), request=self.request)
+            if not filterset.is_valid():
+                raise filter_utils.translate_validation(filterset.errors)
+            parts.append(filterset.qs.order_by().values(
+                *self.history_fields,
+                archived=Value(archived, output_field=BooleanField()),
+            ))
+        history = parts[0].union(parts[1], all=True)
+        return filters.OrderingFilter().filter_queryset(self.request, history, self)
+
+class StockReservationViewSet(viewsets.ReadOnlyModelViewSet):
+    
+    serializer_class = StockReservationSerializer
+    permission_classes = [IsAdminUser]
     
     def get_queryset(self):
-        return Sale.objects.select_related('product', 'created_by')
\ No newline at end of file
+        queryset = StockReservation.objects.select_related('product')
+        if self.action == 'list':
+            return queryset.active()
+        return queryset
+    
+    @action(detail=True, methods=['post'])
+    def confirm(self, request, pk=None):
+        # Converting the hold into a sale
+        reservation = self.get_object()
+        
+        try:
+            sale = reservation.confirm()
+        except (StockReservation.DoesNotExist, InsufficientStock) as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_409_CONFLICT)
+        
+        serializer = SaleSerializer(sale, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['post'])
+    def release(self, request, pk=None):
+        # Giving the held units back before the hold expires
+        reservation = self.get_object()
+        reservation.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class ValuationView(ReplicaReadMixin, APIView):
+    
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        # Inventory value at ?at=, a datetime or a date meaning the end of that day; now by default
+        at = self.parse_at(request.query_params.get('at'))
+        if at is None:
+            return Response(
+                {"at": "Must be an ISO 8601 date or datetime."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        categories = reports.inventory_valuation(at)
+        serializer = InventoryValuationSerializer({
+            'at': at,
+            'product_count': sum(row['product_count'] for row in categories),
+            'total_units': sum(row['units'] for row in categories),
+            'total_value': sum((row['value'] for row in categories), Decimal('0.00')),
+            'categories': categories,
+        })
+        return Response(serializer.data)
+    
+    def parse_at(self, value):
+        if not value:
+            return timezone.now()
+        try:
+            day = parse_date(value)
+            at = datetime.combine(day, time.max) if day else parse_datetime(value)
+        except ValueError:
+            return None
+        if at is None:
+            return None
+        if timezone.is_naive(at):
+            at = timezone.make_aware(at)
+        return at
+
+class SyncView(ReplicaReadMixin, APIView):
+    
+    permission_classes = [IsAdminOrReadOnly]
+    
+    # Models exposed to offline clients and the columns they receive
+    sync_models = [
+        ('categories', Category, ['id', 'name', 'description', 'created_at', 'updated_at']),
+        ('products', Product, [
+            'id', 'name', 'category', 'price', 'quantity', 'description',
+            'image', 'created_at', 'updated_at'
+        ]),
+    ]
+    
+    def get(self, request):
+        # Streaming every row changed or deleted since the cursor
+        since = request.query_params.get('since')
+        now = timezone.now()
+        if since:
+            try:
+                since = parse_datetime(since)
+            except ValueError:
+                since = None
+            if since is None:
+                return Response(
+                    {"since": "Must be a cursor returned by a previous sync."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+            # Deletions older than the retention period are pruned, so they can no longer be replayed
+            retention = timedelta(days=getattr(settings, 'TOMBSTONE_RETENTION_DAYS', 30))
+            if since < now - retention:
+                return Response(
+                    {"detail": "Cursor is too old for a delta sync. Sync again without since."},
+                    status=status.HTTP_410_GONE
+                )
+        
+        # Rows whose updated_at is set before a read but commit after it would be missed,
+        # so the next sync re-reads a little history and clients apply rows by id
+        overlap = timedelta(seconds=getattr(settings, 'SYNC_OVERLAP_SECONDS', 60))
+        cursor = now - overlap
+        
+        # The body is produced after dispatch returns, so the alias is fixed now
+        using = router.db_for_read(Product)
+        response = StreamingHttpResponse(
+            self.stream(since, cursor, using), content_type='application/json'
+        )
+        response['Cache-Control'] = 'no-store'
+        return response
+    
+    def stream(self, since, cursor, using):
+        chunk_size = getattr(settings, 'SYNC_CHUNK_SIZE', 500)
+        encoder = DjangoJSONEncoder()
+        
+        yield '{"cursor": %s' % encoder.encode(cursor)
+        
+        for key, model, fields in self.sync_models:
+            queryset = model.objects.using(using).order_by()
+            if since:
+                queryset = queryset.filter(updated_at__gte=since)
+            
+            yield ', "%s": [' % key
+            rows = queryset.values(*fields).iterator(chunk_size=chunk_size)
+            buffer = []
+            separator = ''
+            for row in rows:
+                buffer.append(encoder.encode(row))
+                if len(buffer) >= chunk_size:
+                    yield separator + ', '.join(buffer)
+                    buffer = []
+                    separator = ', '
+            if buffer:
+                yield separator + ', '.join(buffer)
+            yield ']'
+        
+        deleted = {key: [] for key, _, _ in self.sync_models}
+        if since:
+            names = {model._meta.model_name: key for key, model, _ in self.sync_models}
+            tombstones = Tombstone.objects.using(using).filter(
+                deleted_at__gte=since, model_name__in=names
+            ).values_list('model_name', 'object_id')
+            for model_name, object_id in tombstones.iterator(chunk_size=chunk_size):
+                deleted[names[model_name]].append(object_id)
+        
+        yield ', "deleted": %s}' % encoder.encode(deleted)
+
+class BatchView(APIView):
+    
+    # Every sub-request still runs its own view's permission checks
+    permission_classes = [permissions.IsAuthenticated]
+    
+    # Only the catalog and sales routes may be called from inside a batch
+    allowed_viewsets = (CategoryViewSet, ProductViewSet, SaleViewSet)
+    
+    # "$0.id" refers to the field "id" of the response to operation 0
+    reference_pattern = re.compile(r'\$(\d+)\.(\w+)')
+    
+    # Set once an operation of this batch has been sent to a view that may write
+    has_written = False
+    
+    def post(self, request):
+        # Running an ordered list of API calls in-process under one authentication
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        operations = serializer.validated_data['operations']
+        results = [None] * len(operations)
+        
+        if not serializer.validated_data['atomic']:
+            for index, operation in enumerate(operations):
+                results[index] = self.run_operation(request, operation, results)
+            return Response({"results": results})
+        # Atomic batches read from the primary anyway: the router keeps open transactions there
+        
+        with transaction.atomic():
+            for index, operation in enumerate(operations):
+                results[index] = self.run_operation(request, operation, results)
+                if results[index]['status'] >= 400:
+                    # Undoing every earlier operation in the batch
+                    transaction.set_rollback(True)
+                    return Response(
+                        {"detail": f"Operation {index} failed; batch rolled back.", "results": results},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+        return Response({"results": results})
+    
+    def run_operation(self, request, operation, results):
+        try:
+            path = self.reference_pattern.sub(
+                lambda match: str(self.lookup_reference(match, results)), operation['path']
+            )
+            body = self.resolve_references(operation.get('body'), results)
+        except LookupError as exc:
+            return {"status": status.HTTP_400_BAD_REQUEST, "body": {"detail": str(exc)}}
+        
+        path, _, query_string = path.partition('?')
+        try:
+            match = resolve(path)
+        except Resolver404:
+            match = None
+        if match is None or getattr(match.func, 'cls', None) not in self.allowed_viewsets:
+            return {"status": status.HTTP_404_NOT_FOUND, "body": {"detail": "Not found."}}
+        
+        sub_request = self.build_request(request, operation['method'], path, query_string, body)
+        # Reads after a write in the same batch must see it, and replicas may not have it yet
+        sub_request.pinned_to_primary = self.has_written
+        if operation['method'] not in permissions.SAFE_METHODS:
+            self.has_written = True
+        try:
+            response = match.func(sub_request, *match.args, **match.kwargs)
+        except Exception:
+            # Reported for this operation alone, so the results of earlier ones are not lost
+            logger.exception("Batch operation %s %s failed", operation['method'], path)
+            return {
+                "status": status.HTTP_500_INTERNAL_SERVER_ERROR,
+                "body": {"detail": "Internal server error."},
+            }
+        return {"status": response.status_code, "body": getattr(response, 'data', None)}
+    
+    def build_request(self, request, method, path, query_string, body):
+        content = b'' if body is None else json.dumps(body, cls=DjangoJSONEncoder).encode()
+        environ = {
+            key: value for key, value in request.META.items()
+            if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH', 'QUERY_STRING', 'wsgi.input')
+        }
+        environ.update({
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'SCRIPT_NAME': '',
+            'QUERY_STRING': query_string,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(content)),
+            'wsgi.input': BytesIO(content),
+        })
+        sub_request = WSGIRequest(environ)
+        # Reusing the already authenticated user instead of decoding the token again
+        sub_request._force_auth_user = request.user
+        sub_request._force_auth_token = request.auth
+        return sub_request
+    
+    def lookup_reference(self, match, results):
+        index, field = int(match.group(1)), match.group(2)
+        if index >= len(results) or results[index] is None:
+            raise LookupError(f"Operation {index} has not run yet.")
+        body = results[index]['body']
+        if not isinstance(body, dict) or field not in body:
+            raise LookupError(f"Operation {index} has no field '{field}'.")
+        return body[field]
+    
+    def resolve_references(self, value, results):
+        if isinstance(value, dict):
+            return {key: self.resolve_references(item, results) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.resolve_references(item, results) for item in value]
+        if isinstance(value, str):
+            match = self.reference_pattern.fullmatch(value)
+            if match:
+                return self.lookup_reference(match, results)
+        return value
@@ -0,0 +1,13 @@
+"""
+ASGI config for API-only workers.
+
+Same as ``backend.asgi`` but with the lean ``backend.settings_api`` profile.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings_api')
+
+application = get_asgi_application()
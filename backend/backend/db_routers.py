@@ -0,0 +1,67 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+# Set only while a view that tolerates replica lag is handling a safe request
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def enable_replica_reads():
+    _replica_reads.set(True)
+
+
+def disable_replica_reads():
+    _replica_reads.set(False)
+
+
+# The pin travels with the client, so whichever worker serves the next read honours it
+PIN_COOKIE = 'primary_pin'
+PIN_SALT = 'backend.db_routers.primary_pin'
+
+
+def pin_to_primary(response, user):
+    # Keeping the user's reads on the primary until replicas catch up with the write
+    response.set_signed_cookie(
+        PIN_COOKIE, user.pk, salt=PIN_SALT,
+        max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5), httponly=True, samesite='Lax',
+    )
+
+
+def is_pinned_to_primary(request):
+    # Set by callers that know this request depends on a write just made, e.g. a batch
+    if getattr(request, 'pinned_to_primary', False):
+        return True
+    user = getattr(request, 'user', None)
+    if not (user and user.is_authenticated):
+        return False
+    # Expired, tampered with or issued to another user counts as no pin
+    pinned = request.get_signed_cookie(
+        PIN_COOKIE, default=None, salt=PIN_SALT,
+        max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+    )
+    return pinned == str(user.pk)
+
+
+class ReplicaRouter:
+    """Sends reads to a replica when the current view allows it, everything else to default."""
+    
+    def db_for_read(self, model, **hints):
+        # The database cache must be read where it is written, or invalidations would lag
+        if model._meta.app_label == 'django_cache':
+            return 'default'
+        # A transaction may have written rows no replica has yet, and must see them
+        if connections['default'].in_atomic_block:
+            return 'default'
+        replicas = getattr(settings, 'REPLICA_DATABASES', [])
+        if replicas and _replica_reads.get():
+            return random.choice(replicas)
+        return 'default'
+    
+    def db_for_write(self, model, **hints):
+        return 'default'
+    
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
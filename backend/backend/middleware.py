@@ -0,0 +1,105 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from .compression import DEFAULT_LEVELS, compress, compress_async_stream, compress_stream, negotiate
+from .db_routers import pin_to_primary
+
+
+class ResponseMiddleware:
+    """Base for middleware that only change the response, in sync and async stacks alike."""
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+    
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+
+class ReplicaStickinessMiddleware(ResponseMiddleware):
+    """Pins a user to the primary database for a short while after they write."""
+    
+    def process_response(self, request, response):
+        if (
+            getattr(settings, 'REPLICA_DATABASES', [])
+            and request.method not in ('GET', 'HEAD', 'OPTIONS')
+            and response.status_code < 400
+        ):
+            # DRF copies the token-authenticated user back onto the Django request
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                pin_to_primary(response, user)
+        
+        return response
+
+
+class RateLimitHeadersMiddleware(ResponseMiddleware):
+    """Adds X-RateLimit-* headers recorded by the token-bucket throttles."""
+    
+    def process_response(self, request, response):
+        rate_limit = getattr(request, 'rate_limit', None)
+        if rate_limit is not None:
+            response['X-RateLimit-Limit'] = rate_limit['limit']
+            response['X-RateLimit-Remaining'] = rate_limit['remaining']
+            response['X-RateLimit-Reset'] = rate_limit['reset']
+        
+        return response
+
+
+class CompressionMiddleware(ResponseMiddleware):
+    """Compresses responses with brotli or gzip, whichever the client prefers."""
+    
+    def process_response(self, request, response):
+        # Only listed content types; images, archives and HTML pages are left alone
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        levels = getattr(settings, 'COMPRESSION_LEVELS', {}).get(content_type)
+        if (
+            levels is None
+            or response.status_code < 200
+            or response.status_code in (204, 206, 304)
+            or response.has_header('Content-Encoding')
+        ):
+            return response
+        if not response.streaming and len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+            return response
+        
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        level = levels.get(encoding, DEFAULT_LEVELS[encoding])
+        
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = compress_async_stream(
+                    response.streaming_content, encoding, level
+                )
+            else:
+                response.streaming_content = compress_stream(
+                    response.streaming_content, encoding, level
+                )
+            del response['Content-Length']
+        else:
+            compressed = compress(response.content, encoding, level)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        
+        # The compressed body is a different representation, so a strong ETag becomes weak
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        
+        return response
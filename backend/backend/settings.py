@@ -1,10 +1,11 @@
 from pathlib import Path
 from datetime import timedelta
 import os
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+# Load environment variables from .env unless the process already provides them all
+if os.getenv('DJANGO_LOAD_DOTENV', 'True') == 'True':
+    from dotenv import load_dotenv
+    load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'backend.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -45,6 +47,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'backend.middleware.ReplicaStickinessMiddleware',
+    'backend.middleware.RateLimitHeadersMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -78,6 +82,58 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
         'PORT': os.getenv('DB_PORT', ''),
+        # Persistent connections, checked before reuse
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+    }
+}
+
+# SQLite production profile: WAL, tuned pragmas and BEGIN IMMEDIATE transactions
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3' and os.getenv('SQLITE_PRODUCTION', 'False') == 'True':
+    DATABASES['default']['ENGINE'] = 'backend.sqlite'
+    DATABASES['default']['OPTIONS'] = {
+        # Seconds Python's sqlite3 waits for a lock before raising
+        'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)) / 1000,
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+            'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 268435456)),
+            # Negative values are KiB
+            'cache_size': -int(os.getenv('SQLITE_CACHE_KB', 65536)),
+            'temp_store': 'MEMORY',
+        },
+        'write_queue': os.getenv('SQLITE_WRITE_QUEUE', 'False') == 'True',
+    }
+
+# Read replicas: comma-separated hosts, or database files for SQLite
+REPLICA_DATABASES = []
+for index, replica in enumerate(filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1):
+    alias = f'replica{index}'
+    # The SQLite production profile has already swapped in its own engine by now
+    sqlite = DATABASES['default']['ENGINE'] in ('django.db.backends.sqlite3', 'backend.sqlite')
+    location = 'NAME' if sqlite else 'HOST'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        location: os.path.join(BASE_DIR, replica.strip()) if location == 'NAME' else replica.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    if DATABASES['default']['ENGINE'] == 'backend.sqlite':
+        # Replica files are only read, so they skip BEGIN IMMEDIATE and the write queue
+        DATABASES[alias]['OPTIONS'] = {**DATABASES['default']['OPTIONS'], 'read_only': True}
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['backend.db_routers.ReplicaRouter']
+
+# Seconds a user keeps reading from the primary after a write
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+
+# Per process by default. With several workers, point it at a cache they share (Redis or
+# Memcached) so cached reports are invalidated everywhere and throttles can sync usage.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
@@ -99,6 +155,20 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing off the request thread (see users/passwords.py). Sign-ins go
+# through the usual authenticate() backends, with PasswordPoolBackend checking
+# passwords on PASSWORD_CHECK_THREADS threads (0 for one per CPU), which the async
+# token view awaits; token requests get a 503 once PASSWORD_CHECK_QUEUE checks are waiting.
+AUTHENTICATION_BACKENDS = ['users.backends.PasswordPoolBackend']
+PASSWORD_CHECK_THREADS = int(os.getenv('PASSWORD_CHECK_THREADS', 0))
+PASSWORD_CHECK_QUEUE = int(os.getenv('PASSWORD_CHECK_QUEUE', 64))
+# Processes hashing the passwords of bulk-provisioned users (0 for one per CPU),
+# spawned once per process and kept
+PASSWORD_HASH_PROCESSES = int(os.getenv('PASSWORD_HASH_PROCESSES', 0))
+USER_BULK_MAX = int(os.getenv('USER_BULK_MAX', 500))
+# Upgrading stored hashes to the current hasher settings on login costs a second hash per login
+PASSWORD_REHASH_ON_LOGIN = os.getenv('PASSWORD_REHASH_ON_LOGIN', 'True') == 'True'
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -131,6 +201,39 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    'DEFAULT_THROTTLE_CLASSES': [
+        'backend.throttling.TokenBucketThrottle',
+    ],
+    # Per role for authenticated users, 'anon' otherwise; token requests are limited per
+    # account and address ('login') and per address ('login_ip')
+    'DEFAULT_THROTTLE_RATES': {
+        'ADMIN': os.getenv('THROTTLE_RATE_ADMIN', '1200/min'),
+        'USER': os.getenv('THROTTLE_RATE_USER', '600/min'),
+        'anon': os.getenv('THROTTLE_RATE_ANON', '60/min'),
+        'login': os.getenv('THROTTLE_RATE_LOGIN', '10/min'),
+        'login_ip': os.getenv('THROTTLE_RATE_LOGIN_IP', '30/min'),
+    },
+}
+
+# Seconds between pushing throttle usage to the shared cache (0 keeps it per process)
+THROTTLE_SYNC_INTERVAL = float(os.getenv('THROTTLE_SYNC_INTERVAL', 0))
+THROTTLE_MAX_BUCKETS = int(os.getenv('THROTTLE_MAX_BUCKETS', 100000))
+
+# Response compression: brotli when installed and accepted, gzip otherwise.
+# Non-streamed bodies smaller than COMPRESSION_MIN_SIZE bytes are sent as is.
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+# Levels per content type (gzip 1-9, brotli 0-11); other content types are not compressed
+COMPRESSION_LEVELS = {
+    'application/json': {
+        'gzip': int(os.getenv('COMPRESSION_JSON_GZIP_LEVEL', 6)),
+        'br': int(os.getenv('COMPRESSION_JSON_BROTLI_QUALITY', 5)),
+    },
+    # Admin CSV exports stream many megabytes, so a cheaper level keeps up with the database
+    'text/csv': {
+        'gzip': int(os.getenv('COMPRESSION_STREAM_GZIP_LEVEL', 4)),
+        'br': int(os.getenv('COMPRESSION_STREAM_BROTLI_QUALITY', 4)),
+    },
+    'text/plain': {'gzip': 6, 'br': 5},
 }
 
 # JWT Settings
@@ -154,4 +257,52 @@ CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', 'http://localhost:5173,
 CORS_ALLOW_CREDENTIALS = True
 
 # Stock threshold level
-STOCK_THRESHOLD = int(os.getenv('STOCK_THRESHOLD', 5))
\ No newline at end of file
+STOCK_THRESHOLD = int(os.getenv('STOCK_THRESHOLD', 5))
+
+# Stock reservations (seconds)
+RESERVATION_TTL = int(os.getenv('RESERVATION_TTL', 900))
+RESERVATION_MAX_TTL = int(os.getenv('RESERVATION_MAX_TTL', 3600))
+
+# Rows fetched per database round trip by the sync endpoint
+SYNC_CHUNK_SIZE = int(os.getenv('SYNC_CHUNK_SIZE', 500))
+# Seconds of history each delta sync re-reads, for writes that committed late
+SYNC_OVERLAP_SECONDS = int(os.getenv('SYNC_OVERLAP_SECONDS', 60))
+# Days deletions are kept for sync; older cursors must sync again from scratch
+TOMBSTONE_RETENTION_DAYS = int(os.getenv('TOMBSTONE_RETENTION_DAYS', 30))
+
+# Maximum number of operations accepted by the batch endpoint
+BATCH_MAX_OPERATIONS = int(os.getenv('BATCH_MAX_OPERATIONS', 100))
+
+# Months of sales kept in the hot table before archive_sales moves them
+SALES_HOT_MONTHS = int(os.getenv('SALES_HOT_MONTHS', 12))
+
+# Product autocomplete: results per request and seconds between index refreshes
+AUTOCOMPLETE_MAX_RESULTS = int(os.getenv('AUTOCOMPLETE_MAX_RESULTS', 10))
+AUTOCOMPLETE_REFRESH_SECONDS = int(os.getenv('AUTOCOMPLETE_REFRESH_SECONDS', 30))
+
+# Seconds per-category stats are cached; writes invalidate them earlier
+CATEGORY_STATS_CACHE_SECONDS = int(os.getenv('CATEGORY_STATS_CACHE_SECONDS', 300))
+
+# Demand forecasting and reorder suggestions
+FORECAST_HISTORY_DAYS = int(os.getenv('FORECAST_HISTORY_DAYS', 365))
+FORECAST_SMOOTHING = float(os.getenv('FORECAST_SMOOTHING', 0.3))
+FORECAST_CACHE_SECONDS = int(os.getenv('FORECAST_CACHE_SECONDS', 3600))
+REORDER_LEAD_TIME_DAYS = int(os.getenv('REORDER_LEAD_TIME_DAYS', 7))
+REORDER_COVER_DAYS = int(os.getenv('REORDER_COVER_DAYS', 30))
+
+# Background jobs (manage.py run_worker)
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 5))
+# Seconds before the first retry; doubles on every further attempt
+JOB_RETRY_BACKOFF = int(os.getenv('JOB_RETRY_BACKOFF', 30))
+# Seconds after which a RUNNING job is assumed lost and queued again
+JOB_LOCK_TIMEOUT = int(os.getenv('JOB_LOCK_TIMEOUT', 600))
+# Seconds low-stock events are collected into one digest
+LOW_STOCK_DIGEST_DELAY = int(os.getenv('LOW_STOCK_DIGEST_DELAY', 300))
+ADMINS = [
+    (email.split('@')[0], email)
+    for email in filter(None, os.getenv('ADMIN_EMAILS', '').split(','))
+]
+
+# Admin changelists skip exact counts on unfiltered tables larger than this
+ADMIN_COUNT_LIMIT = int(os.getenv('ADMIN_COUNT_LIMIT', 10000))
@@ -0,0 +1,53 @@
+"""
+API-only settings for web workers.
+
+Serves the ``api`` and ``users`` URLconfs and nothing else: no admin,
+sessions, messages, static files, djoser or browsable API. Configuration comes
+from the process environment, not ``.env``, unless ``DJANGO_LOAD_DOTENV`` is
+set to ``True``. Run workers through ``backend.wsgi_api`` or
+``backend.asgi_api``; management commands, the admin and the tests keep
+using ``backend.settings``.
+"""
+
+import os
+
+os.environ.setdefault('DJANGO_LOAD_DOTENV', 'False')
+
+from .settings import *  # noqa: E402,F401,F403
+from .settings import INSTALLED_APPS, MIDDLEWARE, REST_FRAMEWORK  # noqa: E402
+
+# Apps that only add admin pages, templates or unused endpoints
+INSTALLED_APPS = [
+    app for app in INSTALLED_APPS
+    if app not in (
+        'django.contrib.admin',
+        'django.contrib.sessions',
+        'django.contrib.messages',
+        'django.contrib.staticfiles',
+        'rest_framework',
+        'rest_framework_simplejwt',
+        'djoser',
+        'django_filters',
+    )
+]
+
+# JWT authentication needs neither sessions nor CSRF protection
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware not in (
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+        'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    )
+]
+
+ROOT_URLCONF = 'backend.urls_api'
+WSGI_APPLICATION = 'backend.wsgi_api.application'
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+}
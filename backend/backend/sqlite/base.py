@@ -0,0 +1,99 @@
+"""
+SQLite backend tuned for concurrent writes in production.
+
+Selected with ``SQLITE_PRODUCTION=True``. On every new connection it applies
+the pragmas from ``OPTIONS['pragmas']`` (WAL, synchronous, busy timeout, mmap
+and cache size) and it opens ``atomic`` blocks with ``BEGIN IMMEDIATE`` so a
+write transaction takes the write lock up front instead of failing with
+``database is locked`` when it tries to upgrade a read lock halfway through.
+
+With ``OPTIONS['write_queue']`` enabled, transactions in the same process also
+wait on an in-process lock for their database file, so threads queue up in
+Python rather than spinning on SQLite's busy handler.
+
+Connections with ``OPTIONS['read_only']``, such as read replicas, refuse writes
+and open plain deferred transactions without taking either lock.
+"""
+
+import os
+import threading
+
+from django.db.backends.sqlite3 import base
+
+# One write queue per database file, shared by every connection to it in the process.
+# Reentrant so a thread holding it through one alias fails on SQLite's busy timeout
+# through another alias of the same file instead of deadlocking.
+_write_locks = {}
+_write_locks_guard = threading.Lock()
+
+
+def get_write_lock(name):
+    key = name if name == ':memory:' else os.path.realpath(name)
+    with _write_locks_guard:
+        return _write_locks.setdefault(key, threading.RLock())
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = options.get('pragmas', {})
+        self.read_only = options.get('read_only', False)
+        self.write_queue = options.get('write_queue', False) and not self.read_only
+        self.write_lock = None
+        self.holds_write_lock = False
+    
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        # Not sqlite3.connect() arguments
+        kwargs.pop('pragmas', None)
+        kwargs.pop('write_queue', None)
+        kwargs.pop('read_only', None)
+        return kwargs
+    
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        if self.read_only:
+            conn.execute('PRAGMA query_only = ON')
+        return conn
+    
+    def _start_transaction_under_autocommit(self):
+        if self.read_only:
+            # Readers never need the write lock, so they must not queue behind writers
+            return super()._start_transaction_under_autocommit()
+        if self.write_queue and not self.holds_write_lock:
+            # Looked up per transaction, since test runs rename the database after connecting
+            self.write_lock = get_write_lock(str(self.settings_dict['NAME']))
+            self.write_lock.acquire()
+            self.holds_write_lock = True
+        try:
+            self.cursor().execute('BEGIN IMMEDIATE')
+        except Exception:
+            self.release_write_lock()
+            raise
+    
+    def release_write_lock(self):
+        if self.holds_write_lock:
+            self.holds_write_lock = False
+            self.write_lock.release()
+    
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self.release_write_lock()
+    
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self.release_write_lock()
+    
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self.release_write_lock()
@@ -0,0 +1,187 @@
+"""
+Token-bucket request throttling kept in process memory.
+
+Each client gets one bucket per view. Buckets hold up to ``num`` tokens for a
+``num/period`` rate and refill continuously, so short bursts are allowed but
+the sustained rate is capped. The rate comes from the view's
+``throttle_scope`` if it sets one, otherwise from the user's role (``anon``
+for unauthenticated clients), looked up in ``DEFAULT_THROTTLE_RATES``.
+
+Checking a bucket is a dict lookup and some arithmetic under a lock. With
+``THROTTLE_SYNC_INTERVAL`` set, each bucket also reports its usage to the
+shared cache at most that often, so several workers together stay close to
+the configured rate without a cache round trip on every request. A
+process-local cache (``LocMemCache``) would only see one worker's usage, so
+syncing is skipped with one.
+"""
+
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.exceptions import ParseError
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class Bucket:
+
+    __slots__ = ('tokens', 'updated', 'synced', 'unsynced')
+
+    def __init__(self, tokens, now):
+        self.tokens = tokens
+        self.updated = now
+        self.synced = now
+        self.unsynced = 0
+
+
+class TokenBucketThrottle(BaseThrottle):
+
+    # Shared by every throttle instance in the process
+    buckets = {}
+    lock = threading.Lock()
+    timer = time.monotonic
+
+    @classmethod
+    def reset(cls):
+        with cls.lock:
+            cls.buckets.clear()
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope:
+            return scope
+        user = request.user
+        if user and user.is_authenticated:
+            # Roles without a rate of their own get the USER rate rather than no limit
+            role = str(getattr(user, 'role', '') or '').upper()
+            return role if role in api_settings.DEFAULT_THROTTLE_RATES else 'USER'
+        return 'anon'
+
+    def get_ident_key(self, request, view):
+        user = request.user
+        if user and user.is_authenticated:
+            return f'user:{user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def parse_rate(self, rate):
+        num, period = rate.split('/')
+        return int(num), PERIODS[period[0]]
+
+    def allow_request(self, request, view):
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.get_scope(request, view))
+        if rate is None:
+            return True
+        capacity, period = self.parse_rate(rate)
+        refill = capacity / period
+        key = f'{view.__class__.__name__}:{self.get_ident_key(request, view)}'
+
+        with self.lock:
+            now = self.timer()
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                if len(self.buckets) >= getattr(settings, 'THROTTLE_MAX_BUCKETS', 100000):
+                    self.prune(now)
+                bucket = self.buckets[key] = Bucket(capacity, now)
+            else:
+                bucket.tokens = min(capacity, bucket.tokens + (now - bucket.updated) * refill)
+                bucket.updated = now
+
+            sync_interval = getattr(settings, 'THROTTLE_SYNC_INTERVAL', 0)
+            if sync_interval and now - bucket.synced >= sync_interval and cache_is_shared():
+                self.sync(key, bucket, capacity, period, now)
+
+            allowed = bucket.tokens >= 1
+            if allowed:
+                bucket.tokens -= 1
+                bucket.unsynced += 1
+            remaining = int(bucket.tokens)
+            reset = (capacity - bucket.tokens) / refill
+            self.wait_seconds = 0 if allowed else (1 - bucket.tokens) / refill
+
+        self.record_headers(request, capacity, remaining, reset)
+        return allowed
+
+    def sync(self, key, bucket, capacity, period, now):
+        # Adding this process's usage to the shared count for the current window
+        cache = caches['default']
+        window_key = f'throttle:{key}:{int(time.time() // period)}'
+        cache.add(window_key, 0, period * 2)
+        try:
+            used = cache.incr(window_key, bucket.unsynced)
+        except ValueError:
+            # The key expired between add() and incr()
+            used = bucket.unsynced
+        bucket.unsynced = 0
+        bucket.synced = now
+        # Tokens other workers already spent this window are not available here
+        bucket.tokens = min(bucket.tokens, max(0, capacity - used))
+
+    def prune(self, now):
+        # Dropping the least recently used half; an evicted client simply starts with a full bucket
+        oldest = sorted(self.buckets, key=lambda key: self.buckets[key].updated)
+        for key in oldest[:len(oldest) // 2]:
+            del self.buckets[key]
+
+    def record_headers(self, request, limit, remaining, reset):
+        # Picked up by RateLimitHeadersMiddleware; the tightest throttle wins
+        current = getattr(request._request, 'rate_limit', None)
+        if current is None or remaining < current['remaining']:
+            request._request.rate_limit = {
+                'limit': limit,
+                'remaining': remaining,
+                'reset': max(0, int(reset + 0.999)),
+            }
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginIPThrottle(TokenBucketThrottle):
+    # Token requests per address, whatever account they name: trying a new username on
+    # each attempt must not get a fresh bucket, as every attempt costs a full hash
+
+    def get_scope(self, request, view):
+        return 'login_ip'
+
+    def get_ident_key(self, request, view):
+        return f'ip:{self.get_ident(request)}'
+
+
+class LoginAccountThrottle(TokenBucketThrottle):
+    # Strict bucket for password checks on one account, separate from the API rates
+
+    def get_scope(self, request, view):
+        return 'login'
+
+    def get_ident_key(self, request, view):
+        # Per account and address, so staff signing in from one store behind a NAT
+        # do not share a single bucket
+        try:
+            username = request.data.get(get_user_model().USERNAME_FIELD, '')
+        except (ParseError, AttributeError):
+            username = ''
+        # Hashed to keep arbitrary input out of cache keys
+        account = hashlib.sha256(str(username).strip().lower().encode()).hexdigest()[:16]
+        return f'ip:{self.get_ident(request)}:account:{account}'
+
+
+def cache_is_shared():
+    # Usage synced through a per-process cache would only ever count this worker
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+@receiver(setting_changed)
+def reset_buckets(setting, **kwargs):
+    # Buckets sized for the old rates must not outlive them, e.g. between test classes
+    if setting == 'REST_FRAMEWORK' or setting.startswith('THROTTLE_'):
+        TokenBucketThrottle.reset()
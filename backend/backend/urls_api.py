@@ -0,0 +1,7 @@
+from django.urls import path, include
+
+# The API without the admin or media files, for backend.settings_api
+urlpatterns = [
+    path('api/', include('api.urls')),
+    path('api/users/', include('users.urls')),
+]
@@ -0,0 +1,55 @@
+"""
+Benchmark scripts for the backend.
+
+Each module is runnable from the backend directory, e.g.::
+
+    python -m benchmarks.batch
+
+Benchmarks run against a throwaway test database, never ``db.sqlite3``.
+"""
+
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+
+def setup(settings_module='backend.settings'):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    # Creating the same kind of disposable database the test runner uses
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(func, repeat=5):
+    # Returning the wall-clock seconds of each run
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(label, timings, per=1):
+    median = statistics.median(timings)
+    print(
+        f"{label:<40} median {median * 1000:9.2f} ms"
+        f"  min {min(timings) * 1000:9.2f} ms"
+        f"  per op {median / per * 1000:8.3f} ms"
+    )
@@ -0,0 +1,109 @@
+"""
+Product autocomplete: prefix index build time, memory and lookup latency at
+catalog scale, then the endpoint next to ``?search=`` on a database catalog.
+
+    python -m benchmarks.autocomplete [--products 1000000] [--db-products 20000]
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+from benchmarks import measure, report, setup, test_database
+
+WORDS = (
+    'claw hammer drill bit saw blade nail screw bolt nut washer anchor hinge bracket '
+    'sander grinder clamp chisel file rasp level tape measure square wrench spanner '
+    'socket ratchet plier cutter stripper crimper torch lamp cable cord plug switch '
+    'paint brush roller tray primer varnish stain glue sealant caulk tile grout '
+    'steel brass copper galvanised stainless heavy duty compact cordless professional'
+).split()
+
+
+def product_names(count, rng):
+    for i in range(count):
+        words = rng.sample(WORDS, rng.randint(2, 5))
+        yield f"{' '.join(words).title()} {rng.randint(1, 999)}mm #{i}"
+
+
+def queries(count, rng):
+    # Mostly 2-5 character prefixes of common words, the way a picker is typed into
+    return [rng.choice(WORDS)[:rng.randint(2, 5)] for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=1_000_000)
+    parser.add_argument('--db-products', type=int, default=20_000)
+    parser.add_argument('--queries', type=int, default=2_000)
+    args = parser.parse_args()
+
+    setup()
+    from api.autocomplete import PrefixIndex
+
+    rng = random.Random(0)
+    products = list(enumerate(product_names(args.products, rng), start=1))
+    prefixes = queries(args.queries, rng)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = PrefixIndex(products)
+    build = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{args.products} products: built in {build:.1f} s, "
+        f"index {current / 2**20:.1f} MiB ({index.nbytes() / 2**20:.1f} MiB packed), "
+        f"peak while building {peak / 2**20:.1f} MiB"
+    )
+
+    report('search (10 results)', measure(lambda: [index.search(q, 10) for q in prefixes]), len(prefixes))
+    report('search (miss)', measure(lambda: [index.search(q + 'zzz', 10) for q in prefixes]), len(prefixes))
+    renames = [(rng.randint(1, args.products), name) for name in product_names(1000, rng)]
+    report('add / rename', measure(lambda: [index.add(*rename) for rename in renames], repeat=1), len(renames))
+    report('search with pending changes', measure(lambda: [index.search(q, 10) for q in prefixes]), len(prefixes))
+
+    with test_database():
+        from django.conf import settings
+        from django.contrib.auth import get_user_model
+        from django.test import override_settings
+        from django.urls import reverse
+        from rest_framework.test import APIClient
+        from api import autocomplete
+        from api.models import Category, Product
+
+        user = get_user_model().objects.create_user(
+            username='bench', email='bench@example.com', password='benchpass123', role='USER'
+        )
+        category = Category.objects.create(name='Bench')
+        Product.objects.bulk_create(
+            (
+                Product(name=name, category=category, price='1.00', quantity=10)
+                for _, name in products[:args.db_products]
+            ),
+            batch_size=5000,
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        sample = prefixes[:200]
+        list_url = reverse('product-list')
+        autocomplete_url = reverse('product-autocomplete')
+
+        unthrottled = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'USER': '1000000/min'}}
+        with override_settings(REST_FRAMEWORK=unthrottled):
+            print(f"{args.db_products} products in the database")
+            autocomplete.reset()
+            report('first autocomplete request (build)', measure(
+                lambda: client.get(autocomplete_url, {'q': 'ham'}), repeat=1
+            ))
+            report('GET /api/products/?search=', measure(
+                lambda: [client.get(list_url, {'search': q}) for q in sample], repeat=3
+            ), len(sample))
+            report('GET /api/products/autocomplete/?q=', measure(
+                lambda: [client.get(autocomplete_url, {'q': q}) for q in sample], repeat=3
+            ), len(sample))
+
+
+if __name__ == '__main__':
+    main()
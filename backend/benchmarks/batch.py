@@ -0,0 +1,57 @@
+"""
+Compares 50 API calls sent one by one against the same 50 calls in one batch.
+
+    python -m benchmarks.batch
+"""
+
+from benchmarks import measure, report, setup, test_database
+
+OPERATIONS = 50
+
+
+def main():
+    setup()
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+    from rest_framework_simplejwt.tokens import AccessToken
+    from api.models import Category, Product
+
+    with test_database():
+        user = get_user_model().objects.create_user(
+            username='bench', email='bench@example.com', password='benchpass123', role='ADMIN'
+        )
+        category = Category.objects.create(name='Bench')
+        products = Product.objects.bulk_create(
+            Product(name=f'Product {i}', category=category, price='1.00', quantity=100)
+            for i in range(OPERATIONS)
+        )
+        # A real bearer token so each separate call pays for JWT decoding
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+        def separate():
+            for product in products:
+                response = client.patch(
+                    f'/api/products/{product.id}/', {'quantity': 50},
+                    content_type='application/json'
+                )
+                assert response.status_code == 200, response.content
+
+        operations = [
+            {'method': 'PATCH', 'path': f'/api/products/{product.id}/', 'body': {'quantity': 50}}
+            for product in products
+        ]
+
+        def batched(atomic):
+            response = client.post(
+                '/api/batch/', {'operations': operations, 'atomic': atomic},
+                content_type='application/json'
+            )
+            assert response.status_code == 200, response.content
+
+        report(f'{OPERATIONS} separate requests', measure(separate), OPERATIONS)
+        report(f'{OPERATIONS} ops, one batch', measure(lambda: batched(False)), OPERATIONS)
+        report(f'{OPERATIONS} ops, one atomic batch', measure(lambda: batched(True)), OPERATIONS)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Bytes saved and CPU spent by response compression on typical API payloads.
+
+    python -m benchmarks.compression [--products 2000] [--sales 20000]
+
+Reports the compressed size of a product page, a sales page, the full sync
+feed and a sales CSV export at several levels, then the end-to-end request
+time with and without ``Accept-Encoding``. brotli rows appear only when the
+``brotli`` package is installed.
+"""
+
+import argparse
+import time
+
+from benchmarks import measure, report, setup, test_database
+
+LEVELS = {'gzip': (1, 4, 6, 9), 'br': (1, 4, 5, 9)}
+
+
+def consume(response):
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=2_000)
+    parser.add_argument('--sales', type=int, default=20_000)
+    args = parser.parse_args()
+
+    setup()
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+    from django.utils import timezone
+    from rest_framework_simplejwt.tokens import AccessToken
+    from api.admin import SaleAdmin
+    from api.models import Category, Product, Sale
+    from backend.compression import ENCODINGS, compress, compress_stream
+
+    with test_database():
+        user = get_user_model().objects.create_user(
+            username='bench', email='bench@example.com', password='benchpass123', role='ADMIN'
+        )
+        categories = Category.objects.bulk_create(
+            Category(name=f'Category {i}', description=f'Everything for job {i}') for i in range(20)
+        )
+        products = Product.objects.bulk_create(
+            Product(
+                name=f'Product {i}', category=categories[i % 20], price=f'{i % 97}.99',
+                quantity=i % 300, description=f'Product {i}, pack of {i % 12 + 1}'
+            )
+            for i in range(args.products)
+        )
+        now = timezone.now()
+        Sale.objects.bulk_create(
+            (
+                Sale(
+                    product=products[i % args.products], quantity=i % 5 + 1, unit_price='9.99',
+                    total_price='19.98', sale_date=now, created_by=user
+                )
+                for i in range(args.sales)
+            ),
+            batch_size=5000,
+        )
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        export = SaleAdmin.actions[0]
+
+        payloads = {
+            'GET /api/products/': lambda **headers: client.get('/api/products/', **headers),
+            'GET /api/sales/': lambda **headers: client.get('/api/sales/', **headers),
+            'GET /api/sync/ (stream)': lambda **headers: client.get('/api/sync/', **headers),
+            'sales CSV export (stream)': lambda **headers: export(None, None, Sale.objects.all()),
+        }
+
+        for label, fetch in payloads.items():
+            response = fetch()
+            body = consume(response)
+            print(f"\n{label}: {len(body):,} bytes")
+            for encoding in ENCODINGS:
+                for level in LEVELS[encoding]:
+                    if response.streaming:
+                        chunks = [body[i:i + 8192] for i in range(0, len(body), 8192)]
+                        run = lambda: b''.join(compress_stream(chunks, encoding, level))
+                    else:
+                        run = lambda: compress(body, encoding, level)
+                    size = len(run())
+                    start = time.process_time()
+                    timings = measure(run, repeat=5)
+                    cpu = (time.process_time() - start) / 5
+                    print(
+                        f"  {encoding:<4} {level}: {size:>10,} bytes  saved {1 - size / len(body):6.1%}"
+                        f"  cpu {cpu * 1000:8.2f} ms  ({cpu / len(body) * 1e9:6.2f} ns/byte)"
+                    )
+
+        print()
+        for label, fetch in list(payloads.items())[:3]:
+            report(f'{label} identity', measure(lambda: consume(fetch()), repeat=10))
+            for encoding in ENCODINGS:
+                report(f'{label} {encoding}', measure(
+                    lambda: consume(fetch(HTTP_ACCEPT_ENCODING=encoding)), repeat=10
+                ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Times reorder suggestions: the NumPy step at catalog scale, then end to end.
+
+    python -m benchmarks.forecasting [--products 100000] [--days 365]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks import measure, report, setup, test_database
+
+
+def synthetic_sales(products, days, density, rng):
+    # Sparse product-days with sales, like the rows load_daily_sales returns
+    cells = rng.random((products, days), dtype=np.float32) < density
+    sale_products, sale_days = np.nonzero(cells)
+    sale_units = rng.poisson(3, len(sale_products)).astype(np.float64) + 1
+    return sale_products.astype(np.int64) + 1, sale_days.astype(np.int64), sale_units
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=100_000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--density', type=float, default=0.3)
+    parser.add_argument('--db-products', type=int, default=1_000)
+    args = parser.parse_args()
+
+    setup()
+    from api.forecasting import compute_suggestions, invalidate_reorder_suggestions, reorder_suggestions
+
+    rng = np.random.default_rng(0)
+    product_ids = np.arange(1, args.products + 1, dtype=np.int64)
+    quantities = rng.integers(0, 500, args.products).astype(np.float64)
+    sales = synthetic_sales(args.products, args.days, args.density, rng)
+    print(f"{args.products} products x {args.days} days, {len(sales[0])} product-days with sales")
+    report(
+        'compute_suggestions',
+        measure(lambda: compute_suggestions(product_ids, quantities, *sales, days=args.days)),
+    )
+
+    with test_database():
+        from datetime import timedelta
+        from django.contrib.auth import get_user_model
+        from django.utils import timezone
+        from api.models import Category, Product, Sale
+
+        user = get_user_model().objects.create_user(
+            username='bench', email='bench@example.com', password='benchpass123', role='ADMIN'
+        )
+        category = Category.objects.create(name='Bench')
+        products = Product.objects.bulk_create(
+            Product(name=f'Product {i}', category=category, price='1.00', quantity=int(quantities[i]))
+            for i in range(args.db_products)
+        )
+        now = timezone.now()
+        db_products, db_days, db_units = synthetic_sales(args.db_products, args.days, args.density, rng)
+        start = time.perf_counter()
+        Sale.objects.bulk_create(
+            (
+                Sale(
+                    product=products[p - 1], quantity=int(u), unit_price=1, total_price=u,
+                    sale_date=now - timedelta(days=args.days - int(d)), created_by=user
+                )
+                for p, d, u in zip(db_products, db_days, db_units)
+            ),
+            batch_size=5000,
+        )
+        print(f"{args.db_products} products, {len(db_products)} sales loaded in {time.perf_counter() - start:.1f} s")
+
+        def uncached():
+            invalidate_reorder_suggestions()
+            reorder_suggestions()
+
+        report('reorder_suggestions (query + compute)', measure(uncached))
+        report('reorder_suggestions (cached)', measure(reorder_suggestions, repeat=50))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Sales ledger reads with names joined from products and users next to the
+product and seller snapshot stored on each sale.
+
+    python -m benchmarks.ledger [--sales 200000] [--products 5000] [--users 50]
+
+Reports a newest-first page and a deep page of both querysets, the query
+plan SQLite picks for each, then ``GET /api/sales/``.
+"""
+
+import argparse
+
+from benchmarks import measure, report, setup, test_database
+
+PAGE = 50
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sales', type=int, default=200_000)
+    parser.add_argument('--products', type=int, default=5_000)
+    parser.add_argument('--users', type=int, default=50)
+    args = parser.parse_args()
+
+    setup()
+    from datetime import timedelta
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.db.models import F
+    from django.utils import timezone
+    from rest_framework.test import APIClient
+    from api.models import Category, Product, Sale
+
+    with test_database():
+        User = get_user_model()
+        users = [
+            User.objects.create_user(
+                username=f'seller{i}', email=f'seller{i}@example.com', password='benchpass123', role='ADMIN'
+            )
+            for i in range(args.users)
+        ]
+        categories = Category.objects.bulk_create(Category(name=f'Category {i}') for i in range(20))
+        products = Product.objects.bulk_create(
+            (
+                Product(name=f'Product {i}', category=categories[i % 20], price='9.99', quantity=100)
+                for i in range(args.products)
+            ),
+            batch_size=5000,
+        )
+        now = timezone.now()
+        Sale.objects.bulk_create(
+            (
+                Sale(
+                    product=products[i % args.products], product_name=products[i % args.products].name,
+                    category=categories[i % args.products % 20], quantity=2, unit_price='9.99',
+                    total_price='19.98', sale_date=now - timedelta(minutes=i),
+                    created_by=users[i % args.users], created_by_username=users[i % args.users].username,
+                )
+                for i in range(args.sales)
+            ),
+            batch_size=5000,
+        )
+
+        fields = ['id', 'product', 'quantity', 'unit_price', 'total_price', 'sale_date', 'created_by']
+        joined = Sale.objects.order_by('-sale_date', '-id').values(
+            *fields,
+            current_product_name=F('product__name'),
+            current_category=F('product__category_id'),
+            current_username=F('created_by__username'),
+        )
+        snapshot = Sale.objects.order_by('-sale_date', '-id').values(
+            *fields, 'product_name', 'category_id', 'created_by_username'
+        )
+        deep = args.sales // 2
+
+        for label, queryset in (('joined', joined), ('snapshot', snapshot)):
+            report(f'{label}: first page', measure(lambda: list(queryset[:PAGE]), repeat=20))
+            report(f'{label}: page at offset {deep}', measure(lambda: list(queryset[deep:deep + PAGE]), repeat=5))
+            report(f'{label}: full scan', measure(lambda: sum(1 for _ in queryset.iterator(chunk_size=5000)), repeat=3))
+            sql, params = queryset[:PAGE].query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                for row in cursor.fetchall():
+                    print(f'    {row[-1]}')
+
+        client = APIClient()
+        client.force_authenticate(users[0])
+        report('GET /api/sales/', measure(lambda: client.get('/api/sales/'), repeat=20))
+        report('GET /api/sales/?page=100', measure(lambda: client.get('/api/sales/', {'page': 100}), repeat=20))
+
+
+if __name__ == '__main__':
+    main()
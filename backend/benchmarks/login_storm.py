@@ -0,0 +1,146 @@
+"""
+A shift-change login storm against the token endpoint under ASGI.
+
+    python -m benchmarks.login_storm [--logins 64] [--concurrency 16]
+
+Sends ``--logins`` token requests, ``--concurrency`` at a time, first with
+Django's ``ModelBackend`` checking passwords in ``authenticate()`` on a worker
+thread and then with ``PasswordPoolBackend``, whose checks the token view
+awaits on the shared pool, while another
+client keeps requesting ``/api/users/me/``. Reports tokens per second, login
+latency and the latency of the other client's requests during the storm. The
+login throttle is lifted for the run. Also times hashing the passwords of
+``--users`` new accounts in one process against the process pool used by
+bulk provisioning.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from benchmarks import measure, report, setup, test_database
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def call(application, method, path, body=b'', headers=()):
+    # One request straight through the ASGI application, the way a server would send it
+    finished = asyncio.Event()
+    status = None
+
+    async def receive():
+        if not finished.is_set():
+            finished.set()
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await application({
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'content-length', str(len(body)).encode()), *headers], 'client': ('127.0.0.1', 50000),
+        'server': ('testserver', 80),
+    }, receive, send)
+    return status
+
+
+async def storm(application, url, payloads, concurrency, token):
+    latencies = []
+    probes = []
+    slots = asyncio.Semaphore(concurrency)
+    done = asyncio.Event()
+
+    async def login(payload):
+        async with slots:
+            start = time.perf_counter()
+            status = await call(
+                application, 'POST', url, json.dumps(payload).encode(),
+                [(b'content-type', b'application/json')],
+            )
+            assert status == 200, status
+            latencies.append(time.perf_counter() - start)
+
+    async def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            status = await call(application, 'GET', '/api/users/me/', headers=[(b'authorization', f'Bearer {token}'.encode())])
+            assert status == 200, status
+            probes.append(time.perf_counter() - start)
+            await asyncio.sleep(0.01)
+
+    prober = asyncio.create_task(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(login(payload) for payload in payloads))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await prober
+    return elapsed, latencies, probes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--users', type=int, default=32)
+    args = parser.parse_args()
+
+    setup()
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import make_password
+    from django.core.handlers.asgi import ASGIHandler
+    from django.test import override_settings
+    from rest_framework_simplejwt.tokens import AccessToken
+    from users import passwords
+
+    with test_database():
+        User = get_user_model()
+        hashed = make_password('benchpass123')
+        User.objects.bulk_create(
+            User(username=f'staff{i}', email=f'staff{i}@example.com', password=hashed)
+            for i in range(args.logins)
+        )
+        payloads = [{'email': f'staff{i}@example.com', 'password': 'benchpass123'} for i in range(args.logins)]
+        token = AccessToken.for_user(User.objects.first())
+
+        unthrottled = {
+            **settings.REST_FRAMEWORK,
+            'DEFAULT_THROTTLE_RATES': {'USER': '1000000/min', 'ADMIN': '1000000/min', 'login': '1000000/min', 'login_ip': '1000000/min'},
+        }
+        with override_settings(REST_FRAMEWORK=unthrottled, PASSWORD_CHECK_QUEUE=args.logins):
+            application = ASGIHandler()
+            for label, backend in (
+                ('ModelBackend', 'django.contrib.auth.backends.ModelBackend'),
+                ('PasswordPoolBackend', 'users.backends.PasswordPoolBackend'),
+            ):
+                passwords.reset()
+                with override_settings(AUTHENTICATION_BACKENDS=[backend]):
+                    elapsed, latencies, probes = asyncio.run(
+                        storm(application, '/api/users/token/', payloads, args.concurrency, token)
+                    )
+                print(
+                    f"{label:<26} {args.logins / elapsed:7.1f} tokens/s"
+                    f"  login p50 {statistics.median(latencies) * 1000:7.1f} ms"
+                    f" p99 {percentile(latencies, 0.99) * 1000:7.1f} ms"
+                    f"  /me during storm p50 {statistics.median(probes) * 1000:6.1f} ms"
+                    f" p99 {percentile(probes, 0.99) * 1000:7.1f} ms ({len(probes)} requests)"
+                )
+
+    new_passwords = [f'Shift-{i}-rota' for i in range(args.users)]
+    report('hash in one process', measure(lambda: [make_password(p) for p in new_passwords], repeat=1), args.users)
+    # Once to start the pool's workers, which later batches reuse
+    passwords.hash_passwords(new_passwords[:2])
+    report('hash in process pool', measure(lambda: passwords.hash_passwords(new_passwords), repeat=1), args.users)
+
+
+if __name__ == '__main__':
+    main()
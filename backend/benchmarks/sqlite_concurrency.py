@@ -0,0 +1,101 @@
+"""
+Concurrent sale writes against a SQLite file with and without the production profile.
+
+    python -m benchmarks.sqlite_concurrency [--threads 8] [--sales 200]
+
+Each profile runs in its own process on a fresh database file, because the
+profile is chosen from the environment when settings are loaded.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROFILES = [
+    ('default', {'SQLITE_PRODUCTION': 'False'}),
+    ('production', {'SQLITE_PRODUCTION': 'True', 'SQLITE_WRITE_QUEUE': 'False'}),
+    ('production + write queue', {'SQLITE_PRODUCTION': 'True', 'SQLITE_WRITE_QUEUE': 'True'}),
+]
+
+
+def worker(threads, sales):
+    from benchmarks import setup
+    setup()
+    from django.core.management import call_command
+    from django.db import OperationalError, connection
+    from django.contrib.auth import get_user_model
+    from api.models import Category, Product, Sale
+
+    call_command('migrate', verbosity=0)
+    user = get_user_model().objects.create_user(
+        username='bench', email='bench@example.com', password='benchpass123', role='ADMIN'
+    )
+    category = Category.objects.create(name='Bench')
+    product = Product.objects.create(
+        name='Bench', category=category, price='1.00', quantity=threads * sales
+    )
+    connection.close()
+
+    errors = []
+    done = []
+
+    def sell():
+        from django.db import connection
+        for _ in range(sales):
+            try:
+                Sale(product=product, quantity=1, unit_price=product.price, created_by=user).save()
+                done.append(1)
+            except OperationalError:
+                errors.append(1)
+        connection.close()
+
+    pool = [threading.Thread(target=sell) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    product.refresh_from_db()
+    consistent = product.quantity == threads * sales - len(done)
+    print(f"{len(done)} {len(errors)} {elapsed} {consistent}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--sales', type=int, default=200)
+    parser.add_argument('--worker', action='store_true')
+    args = parser.parse_args()
+
+    if args.worker:
+        return worker(args.threads, args.sales)
+
+    print(f"{args.threads} threads x {args.sales} sales")
+    for label, env in PROFILES:
+        with tempfile.TemporaryDirectory() as directory:
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.sqlite_concurrency', '--worker',
+                 '--threads', str(args.threads), '--sales', str(args.sales)],
+                env={
+                    **os.environ, **env,
+                    'DB_ENGINE': 'django.db.backends.sqlite3',
+                    'DB_NAME': os.path.join(directory, 'bench.sqlite3'),
+                    'DB_REPLICAS': '',
+                },
+                capture_output=True, text=True, check=True,
+            ).stdout.split()
+        ok, errors, elapsed, consistent = int(output[0]), int(output[1]), float(output[2]), output[3]
+        print(
+            f"{label:<26} {ok:6d} ok  {errors:6d} locked"
+            f"  {ok / elapsed:8.1f} sales/s  stock consistent: {consistent}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Cold start of a web worker with the full and the API-only settings profiles.
+
+    python -m benchmarks.startup [--runs 5]
+
+Each run is a fresh interpreter that loads the WSGI application and serves
+one request, reporting the time to a ready application, the time to the
+first response and the resident memory afterwards.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+PROFILES = {
+    'full (backend.wsgi)': 'backend.wsgi',
+    'lean (backend.wsgi_api)': 'backend.wsgi_api',
+}
+
+WORKER = """
+import json, resource, sys, time
+start = time.perf_counter()
+import importlib
+application = importlib.import_module(sys.argv[1]).application
+ready = time.perf_counter()
+from django.test import Client
+response = Client(HTTP_HOST='localhost').get('/api/products/')
+assert response.status_code == 401, response.status_code
+served = time.perf_counter()
+rss = None
+with open('/proc/self/status') as status:
+    for line in status:
+        if line.startswith('VmRSS:'):
+            rss = int(line.split()[1]) * 1024
+if rss is None:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+print(json.dumps({
+    'ready': ready - start, 'served': served - start, 'rss': rss, 'modules': len(sys.modules),
+}))
+"""
+
+
+def run(module):
+    env = {key: value for key, value in os.environ.items() if key != 'DJANGO_SETTINGS_MODULE'}
+    output = subprocess.run(
+        [sys.executable, '-c', WORKER, module],
+        cwd=Path(__file__).resolve().parent.parent, env=env,
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    for label, module in PROFILES.items():
+        runs = [run(module) for _ in range(args.runs)]
+        print(
+            f"{label:<26}"
+            f" ready {statistics.median(r['ready'] for r in runs) * 1000:7.1f} ms"
+            f"  first response {statistics.median(r['served'] for r in runs) * 1000:7.1f} ms"
+            f"  RSS {statistics.median(r['rss'] for r in runs) / 2**20:6.1f} MiB"
+            f"  modules {statistics.median(r['modules'] for r in runs):5.0f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Per-request cost of the token-bucket throttle next to DRF's cache-based throttle.
+
+    python -m benchmarks.throttling
+"""
+
+from benchmarks import measure, report, setup
+
+REQUESTS = 5000
+
+
+def main():
+    setup()
+    from django.contrib.auth import get_user_model
+    from django.test import override_settings
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from rest_framework.throttling import UserRateThrottle
+    from backend.throttling import TokenBucketThrottle
+
+    user = get_user_model()(pk=1, username='bench', email='bench@example.com', role='USER')
+    django_request = APIRequestFactory().get('/api/products/')
+    force_authenticate(django_request, user)
+    request = Request(django_request)
+    request.user
+
+    class View:
+        pass
+
+    view = View()
+    rates = {'USER': f'{REQUESTS * 100}/min', 'user': f'{REQUESTS * 100}/min'}
+
+    def run(throttle_class):
+        def requests():
+            for _ in range(REQUESTS):
+                assert throttle_class().allow_request(request, view)
+        return requests
+
+    with override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': rates}):
+        UserRateThrottle.THROTTLE_RATES = rates
+        report('no throttle', measure(lambda: [object() for _ in range(REQUESTS)]), REQUESTS)
+        report('TokenBucketThrottle', measure(run(TokenBucketThrottle)), REQUESTS)
+        with override_settings(THROTTLE_SYNC_INTERVAL=1):
+            report('TokenBucketThrottle, synced every 1 s', measure(run(TokenBucketThrottle)), REQUESTS)
+        report("DRF UserRateThrottle (locmem cache)", measure(run(UserRateThrottle), repeat=3), REQUESTS)
+
+
+if __name__ == '__main__':
+    main()
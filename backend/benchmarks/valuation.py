@@ -0,0 +1,121 @@
+"""
+Point-in-time inventory valuation over years of price and stock history.
+
+    python -m benchmarks.valuation [--products 2000] [--years 3] [--moves-per-day 0.5]
+
+Builds a history of price changes every couple of months and stock
+movements every few days per product, then values the inventory at several
+moments with ``reports.inventory_valuation`` (one seek per product into each
+history table) next to replaying every stock movement up to that moment.
+Products are bulk-created, so their INITIAL movements are written here.
+"""
+
+import argparse
+import random
+from datetime import timedelta
+
+from benchmarks import measure, report, setup, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=2_000)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--moves-per-day', type=float, default=0.5)
+    args = parser.parse_args()
+
+    setup()
+    from django.db import connection
+    from django.db.models import F, OuterRef, Subquery, Sum
+    from django.test.utils import CaptureQueriesContext
+    from django.utils import timezone
+    from api import reports
+    from api.models import Category, PriceChange, Product, StockMovement
+
+    rng = random.Random(0)
+    days = args.years * 365
+    now = timezone.now()
+    start = now - timedelta(days=days)
+
+    with test_database():
+        categories = Category.objects.bulk_create(Category(name=f'Category {i}') for i in range(20))
+        products = Product.objects.bulk_create(
+            (
+                Product(name=f'Product {i}', category=categories[i % 20], price='10.00', quantity=0)
+                for i in range(args.products)
+            ),
+            batch_size=5000,
+        )
+
+        prices = []
+        for product in products:
+            moment = start
+            price = rng.randint(100, 10000) / 100
+            while moment < now:
+                following = moment + timedelta(days=rng.randint(30, 90))
+                prices.append(PriceChange(
+                    product=product, price=f'{price:.2f}', valid_from=moment,
+                    valid_to=following if following < now else None,
+                ))
+                moment = following
+                price = max(0.5, price * rng.uniform(0.9, 1.15))
+        PriceChange.objects.bulk_create(prices, batch_size=5000)
+
+        movements = []
+        moves = int(days * args.moves_per_day)
+        for product in products:
+            quantity = 0
+            movements.append(StockMovement(
+                product=product, quantity_change=0, quantity_after=0, reason='INITIAL', created_at=start,
+            ))
+            for moment in sorted(start + timedelta(seconds=rng.uniform(0, days * 86400)) for _ in range(moves)):
+                change = rng.randint(20, 200) if quantity < 20 else -rng.randint(1, min(quantity, 10))
+                quantity += change
+                movements.append(StockMovement(
+                    product=product, quantity_change=change, quantity_after=quantity,
+                    reason='ADJUSTMENT' if change > 0 else 'SALE', created_at=moment,
+                ))
+            if len(movements) >= 50_000:
+                StockMovement.objects.bulk_create(movements, batch_size=5000)
+                movements = []
+        StockMovement.objects.bulk_create(movements, batch_size=5000)
+        print(
+            f"{args.products} products, {PriceChange.objects.count():,} price changes, "
+            f"{StockMovement.objects.count():,} stock movements over {args.years} years"
+        )
+
+        def replay(at):
+            # Summing every movement up to the moment, then pricing the totals
+            price = (
+                PriceChange.objects.filter(product=OuterRef('product'), valid_from__lte=at)
+                .order_by('-valid_from')
+                .values('price')[:1]
+            )
+            return (
+                StockMovement.objects.filter(created_at__lte=at)
+                .values('product')
+                .annotate(units=Sum('quantity_change'), price=Subquery(price))
+                .aggregate(value=Sum(F('units') * F('price'), output_field=reports.MONEY))
+            )
+
+        for label, at in (
+            ('1 year in', start + timedelta(days=365)),
+            ('halfway', start + timedelta(days=days / 2)),
+            ('now', now),
+        ):
+            # SQLite sums decimals as floats, so both are compared to the cent
+            value = sum(row['value'] for row in reports.inventory_valuation(at))
+            assert round(value, 2) == round(replay(at)['value'], 2), (value, replay(at))
+            report(f'valuation {label}', measure(lambda: reports.inventory_valuation(at), repeat=5))
+            report(f'replaying movements {label}', measure(lambda: replay(at), repeat=3))
+
+        with CaptureQueriesContext(connection) as queries:
+            reports.inventory_valuation(start + timedelta(days=days / 2))
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {queries.captured_queries[0]['sql']}")
+            for row in cursor.fetchall():
+                print(f'    {row[-1]}')
+
+
+if __name__ == '__main__':
+    main()
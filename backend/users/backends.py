@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from .passwords import check
+
+User = get_user_model()
+
+
+class PasswordPoolBackend(ModelBackend):
+    # ModelBackend with the password check run on the shared pool, which raises
+    # passwords.Busy (503) instead of queueing more checks once it is full
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = User._default_manager.get_by_natural_key(username)
+        except User.DoesNotExist:
+            check(password, None)
+            return None
+        matches, upgraded = check(password, user.password)
+        if upgraded:
+            user.password = upgraded
+            user.save(update_fields=['password'])
+        if matches and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,43 @@
+import csv
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from users.serializers import BulkUserSerializer
+
+COLUMNS = ['username', 'email', 'password', 'role']
+
+
+class Command(BaseCommand):
+    help = 'Creates users from a CSV file with username, email, password and role columns'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file with a header row, or '-' for standard input")
+    
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            rows = list(csv.DictReader(sys.stdin))
+        else:
+            try:
+                with open(options['path'], newline='') as file:
+                    rows = list(csv.DictReader(file))
+            except OSError as exc:
+                raise CommandError(f"Cannot read {options['path']}: {exc.strerror}.")
+        
+        # Empty cells fall back to the serializer defaults, e.g. the USER role
+        rows = [{column: row[column] for column in COLUMNS if row.get(column)} for row in rows]
+        serializer = BulkUserSerializer(data=rows, many=True)
+        if not serializer.is_valid():
+            errors = serializer.errors
+            if isinstance(errors, list):
+                errors = dict(enumerate(errors))
+            # Line 1 is the header
+            problems = [
+                f"line {index + 2}: {field}: {' '.join(messages)}"
+                for index, row_errors in errors.items()
+                for field, messages in row_errors.items()
+            ]
+            raise CommandError("No users were created.\n" + "\n".join(problems))
+        
+        with transaction.atomic():
+            users = serializer.save()
+        self.stdout.write(f"Created {len(users)} users.")
@@ -1,6 +1,8 @@
 from django.db import models
+from django.contrib.auth.hashers import check_password
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
+from .passwords import rehash_on_login
 
 class CustomUser(AbstractUser):
     class Role(models.TextChoices):
@@ -22,4 +24,10 @@ class CustomUser(AbstractUser):
     
     @property
     def is_admin(self):
-        return self.role == self.Role.ADMIN
\ No newline at end of file
+        return self.role == self.Role.ADMIN
+    
+    def check_password(self, raw_password):
+        # Upgrading an outdated hash on login is optional (PASSWORD_REHASH_ON_LOGIN)
+        if rehash_on_login():
+            return super().check_password(raw_password)
+        return check_password(raw_password, self.password)
\ No newline at end of file
@@ -0,0 +1,155 @@
+"""
+Password hashing away from the request thread.
+
+Hashing is slow on purpose, so a login storm or a batch of new staff
+accounts can tie up every worker. Sign-ins check passwords on a thread pool
+shared by the process (PBKDF2, bcrypt and argon2 all release the GIL while
+hashing), and new checks are refused once ``PASSWORD_CHECK_QUEUE`` are
+already waiting. The async token view awaits its check with ``acheck()``
+instead of holding a thread, and ``check()`` from ``authenticate()`` then
+reuses that result. Bulk provisioning hashes in a pool of processes instead,
+one per CPU unless ``PASSWORD_HASH_PROCESSES`` is set. That pool is started
+once per process and kept; its workers are spawned rather than forked from
+a threaded server, and only get the hasher settings.
+
+With ``PASSWORD_REHASH_ON_LOGIN`` off, stored hashes are not upgraded to
+new hasher settings when users log in, which avoids a second hash and a
+write per login right after the hasher cost is raised.
+"""
+
+import asyncio
+import contextvars
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from rest_framework import exceptions
+
+
+class Busy(exceptions.APIException):
+    # Too many password checks are already waiting for the pool
+    status_code = 503
+    default_detail = 'Too many sign-ins in progress, try again shortly.'
+    default_code = 'busy'
+    wait = 1
+
+
+_executor = None
+_slots = None
+_executor_lock = threading.Lock()
+_hash_pool = None
+_hash_pool_key = None
+_hash_pool_lock = threading.Lock()
+# Results acheck() already awaited in this context, by password and hash, for check() to reuse
+checked = contextvars.ContextVar('password_checks', default=None)
+
+
+def rehash_on_login():
+    return getattr(settings, 'PASSWORD_REHASH_ON_LOGIN', True)
+
+
+def get_executor():
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is None:
+            threads = getattr(settings, 'PASSWORD_CHECK_THREADS', None) or os.cpu_count() or 1
+            _slots = threading.BoundedSemaphore(getattr(settings, 'PASSWORD_CHECK_QUEUE', 64))
+            _executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='password')
+    return _executor, _slots
+
+
+def verify(password, encoded):
+    # Returns whether the password matches and, if the stored hash is outdated, its replacement
+    outdated = []
+    setter = outdated.append if rehash_on_login() else None
+    if not check_password(password, encoded, setter):
+        return False, None
+    return True, make_password(password) if outdated else None
+
+
+def reject(password):
+    # Hashing anyway so unknown accounts take as long as wrong passwords
+    make_password(password)
+    return False, None
+
+
+def submit(executor, password, encoded):
+    if encoded is None:
+        return executor.submit(reject, password)
+    return executor.submit(verify, password, encoded)
+
+
+def check(password, encoded):
+    # Like verify(), run on the shared pool; encoded is None for unknown accounts
+    done = checked.get()
+    if done and (password, encoded) in done:
+        return done.pop((password, encoded))
+    executor, slots = get_executor()
+    if not slots.acquire(blocking=False):
+        raise Busy
+    try:
+        return submit(executor, password, encoded).result()
+    finally:
+        slots.release()
+
+
+async def acheck(password, encoded):
+    # check() for async callers, which wait on the pool without holding a thread
+    executor, slots = get_executor()
+    if not slots.acquire(blocking=False):
+        raise Busy
+    try:
+        result = await asyncio.wrap_future(submit(executor, password, encoded))
+    finally:
+        slots.release()
+    done = checked.get()
+    if done is not None:
+        done[(password, encoded)] = result
+    return result
+
+
+def _configure_hash_worker(hashers):
+    # Spawned workers start without Django settings; hashing needs only the hashers
+    settings.configure(PASSWORD_HASHERS=hashers)
+
+
+def get_hash_pool(processes):
+    global _hash_pool, _hash_pool_key
+    hashers = list(settings.PASSWORD_HASHERS)
+    key = (processes, tuple(hashers))
+    with _hash_pool_lock:
+        if _hash_pool_key != key:
+            if _hash_pool is not None:
+                _hash_pool.shutdown(wait=False)
+            _hash_pool = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_configure_hash_worker,
+                initargs=(hashers,),
+            )
+            _hash_pool_key = key
+    return _hash_pool
+
+
+def hash_passwords(passwords):
+    passwords = list(passwords)
+    processes = getattr(settings, 'PASSWORD_HASH_PROCESSES', 0) or os.cpu_count() or 1
+    if processes <= 1 or len(passwords) <= 1:
+        return [make_password(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (processes * 4))
+    return list(get_hash_pool(processes).map(make_password, passwords, chunksize=chunksize))
+
+
+def reset():
+    global _executor, _slots, _hash_pool, _hash_pool_key
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = _slots = None
+    with _hash_pool_lock:
+        if _hash_pool is not None:
+            _hash_pool.shutdown(wait=False)
+        _hash_pool = _hash_pool_key = None
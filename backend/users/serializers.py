@@ -1,6 +1,9 @@
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
+from .passwords import hash_passwords
 
 User = get_user_model()
 
@@ -32,4 +35,58 @@ class UserCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         validated_data.pop('password2')
         user = User.objects.create_user(**validated_data)
-        return user
\ No newline at end of file
+        return user
+
+class BulkUserListSerializer(serializers.ListSerializer):
+    
+    def to_internal_value(self, data):
+        rows = super().to_internal_value(data)
+        # One query per unique field for the whole batch instead of two per user
+        errors = {}
+        for field in ('username', 'email'):
+            values = [row[field] for row in rows]
+            taken = set(User.objects.filter(**{f'{field}__in': values}).values_list(field, flat=True))
+            seen = set()
+            for index, value in enumerate(values):
+                if value in taken or value in seen:
+                    errors.setdefault(index, {})[field] = [f"A user with that {field} already exists."]
+                seen.add(value)
+        if errors:
+            if not api_settings.LIST_SERIALIZER_ERRORS_AS_DICT:
+                errors = [errors.get(index, {}) for index in range(len(rows))]
+            raise serializers.ValidationError(errors)
+        return rows
+    
+    def create(self, validated_data):
+        hashes = hash_passwords(row['password'] for row in validated_data)
+        return User.objects.bulk_create(
+            User(**{**row, 'password': password}) for row, password in zip(validated_data, hashes)
+        )
+
+class BulkUserSerializer(serializers.ModelSerializer):
+    # Used with many=True; passwords are validated here and hashed together in a process pool.
+    # Emails and usernames are normalized as create_user() would before uniqueness is checked.
+    
+    password = serializers.CharField(write_only=True)
+    
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'email', 'password', 'role')
+        read_only_fields = ('id',)
+        # Uniqueness is checked for the whole batch by BulkUserListSerializer
+        extra_kwargs = {'username': {'validators': []}, 'email': {'validators': []}}
+        list_serializer_class = BulkUserListSerializer
+    
+    def validate_email(self, value):
+        return User.objects.normalize_email(value)
+    
+    def validate_username(self, value):
+        return User.normalize_username(value)
+    
+    def validate(self, attrs):
+        user = User(username=attrs['username'], email=attrs['email'])
+        try:
+            validate_password(attrs['password'], user)
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError({'password': list(exc.messages)})
+        return attrs
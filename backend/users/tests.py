@@ -1,3 +1,357 @@
-from django.test import TestCase
+import csv
+import os
+import tempfile
+import threading
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import MD5PasswordHasher
+from django.contrib.auth.signals import user_login_failed
+from backend.throttling import TokenBucketThrottle, cache_is_shared
+from django.urls import resolve
+from users import passwords
 
-# Create your tests here.
+User = get_user_model()
+
+OLD_HASHER = 'django.contrib.auth.hashers.MD5PasswordHasher'
+NEW_HASHER = 'django.contrib.auth.hashers.PBKDF2PasswordHasher'
+
+THROTTLED = {
+    **api_settings.user_settings,
+    'DEFAULT_THROTTLE_RATES': {'USER': '3/min', 'ADMIN': '100/min', 'anon': '2/min', 'login': '2/min', 'login_ip': '5/min'},
+}
+
+@override_settings(REST_FRAMEWORK=THROTTLED)
+class ThrottleTests(TestCase):
+    """Test the token-bucket request throttling."""
+
+    def setUp(self):
+        TokenBucketThrottle.reset()
+        self.addCleanup(TokenBucketThrottle.reset)
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@example.com',
+            password='testpass123',
+            role='USER'
+        )
+
+    def test_role_rate_and_headers(self):
+        """Test that users are limited by their role's rate and told so."""
+        self.client.force_authenticate(user=self.user)
+        url = reverse('user-detail')
+        
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-RateLimit-Limit'], '3')
+        self.assertEqual(res['X-RateLimit-Remaining'], '2')
+        
+        self.client.get(url)
+        self.client.get(url)
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', res)
+        self.assertEqual(res['X-RateLimit-Remaining'], '0')
+
+    def test_login_has_separate_strict_bucket(self):
+        """Test that token requests are throttled per client on their own rate."""
+        url = reverse('token_obtain_pair')
+        payload = {'email': 'user@example.com', 'password': 'wrong'}
+        
+        self.assertEqual(self.client.post(url, payload).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.post(url, payload).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.post(url, payload).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        
+        # Other endpoints keep their own buckets
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(reverse('user-detail')).status_code, status.HTTP_200_OK)
+
+    def test_login_buckets_are_per_account(self):
+        """Test that staff signing in from one address do not exhaust each other's bucket."""
+        url = reverse('token_obtain_pair')
+        for email in ('user@example.com', 'other@example.com'):
+            payload = {'email': email, 'password': 'wrong'}
+            self.assertEqual(self.client.post(url, payload).status_code, status.HTTP_401_UNAUTHORIZED)
+            self.assertEqual(self.client.post(url, payload).status_code, status.HTTP_401_UNAUTHORIZED)
+        
+        payload = {'email': 'USER@example.com ', 'password': 'wrong'}
+        self.assertEqual(self.client.post(url, payload).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_login_bucket_per_address(self):
+        """Test that naming a different account on every try does not lift the limit for an address."""
+        url = reverse('token_obtain_pair')
+        for i in range(5):
+            payload = {'email': f'guess{i}@example.com', 'password': 'wrong'}
+            self.assertEqual(self.client.post(url, payload).status_code, status.HTTP_401_UNAUTHORIZED)
+        
+        payload = {'email': 'guess5@example.com', 'password': 'wrong'}
+        self.assertEqual(self.client.post(url, payload).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        res = self.client.post(url, payload, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_unknown_roles_get_user_rate(self):
+        """Test that roles without a configured rate are limited like regular users."""
+        self.user.role = 'manager'
+        self.user.save()
+        self.client.force_authenticate(user=self.user)
+        url = reverse('user-detail')
+        
+        for _ in range(3):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_usage_is_only_synced_through_a_shared_cache(self):
+        """Test that a per-process cache is not used to share usage between workers."""
+        self.assertFalse(cache_is_shared())
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'django_cache',
+        }}):
+            self.assertTrue(cache_is_shared())
+
+
+class BulkProvisioningTests(TestCase):
+    """Test creating many users at once through the API and the provision_users command."""
+
+    def setUp(self):
+        TokenBucketThrottle.reset()
+        self.addCleanup(TokenBucketThrottle.reset)
+        self.addCleanup(passwords.reset)
+        self.client = APIClient()
+        self.admin = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='testpass123',
+            role='ADMIN'
+        )
+        self.url = reverse('user-bulk-create')
+        self.rows = [
+            {'username': f'staff{i}', 'email': f'staff{i}@example.com', 'password': f'Shift-{i}-rota'}
+            for i in range(3)
+        ]
+
+    @override_settings(PASSWORD_HASH_PROCESSES=2)
+    def test_bulk_create_users(self):
+        """Test that admins can create users in bulk with hashed, usable passwords."""
+        self.client.force_authenticate(user=self.admin)
+        
+        res = self.client.post(self.url, self.rows, format='json')
+        
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([user['username'] for user in res.data], ['staff0', 'staff1', 'staff2'])
+        self.assertNotIn('password', res.data[0])
+        user = User.objects.get(email='staff1@example.com')
+        self.assertEqual(user.role, 'USER')
+        self.assertTrue(user.check_password('Shift-1-rota'))
+
+    def test_bulk_create_normalizes_emails_and_usernames(self):
+        """Test that bulk-created users are normalized like create_user() and checked for uniqueness after."""
+        self.client.force_authenticate(user=self.admin)
+        self.rows[0]['email'] = 'Staff0@EXAMPLE.com'
+        self.rows[1]['username'] = 'sta\ufb001'
+        self.rows[2]['email'] = 'admin@EXAMPLE.COM'
+        
+        res = self.client.post(self.url, self.rows, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', res.data[2])
+        
+        res = self.client.post(self.url, self.rows[:2], format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data[0]['email'], 'Staff0@example.com')
+        self.assertEqual(res.data[1]['username'], 'staff1')
+        self.assertTrue(User.objects.get(username='staff1').check_password('Shift-1-rota'))
+
+    def test_bulk_create_rejects_duplicates_and_weak_passwords(self):
+        """Test that one bad row rejects the whole batch with errors for each row."""
+        self.client.force_authenticate(user=self.admin)
+        self.rows[1]['email'] = 'admin@example.com'
+        self.rows[2]['email'] = self.rows[0]['email']
+        
+        res = self.client.post(self.url, self.rows, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn(0, res.data)
+        self.assertIn('email', res.data[1])
+        self.assertIn('email', res.data[2])
+        
+        self.rows = self.rows[:1]
+        self.rows[0]['password'] = '12345678'
+        res = self.client.post(self.url, self.rows, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('password', res.data[0])
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_bulk_create_user_fails(self):
+        """Test that regular users cannot provision accounts."""
+        user = User.objects.create_user(
+            username='user', email='user@example.com', password='testpass123', role='USER'
+        )
+        self.client.force_authenticate(user=user)
+        
+        res = self.client.post(self.url, self.rows, format='json')
+        
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(PASSWORD_HASH_PROCESSES=2)
+    def test_provision_users_command(self):
+        """Test that the command creates users from a CSV file and reports bad lines."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'staff.csv')
+        with open(path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=['username', 'email', 'password', 'role'])
+            writer.writeheader()
+            writer.writerows([{**row, 'role': 'ADMIN' if i == 0 else ''} for i, row in enumerate(self.rows)])
+        
+        out = StringIO()
+        call_command('provision_users', path, stdout=out)
+        
+        self.assertIn('Created 3 users.', out.getvalue())
+        self.assertEqual(User.objects.get(username='staff0').role, 'ADMIN')
+        self.assertEqual(User.objects.get(username='staff2').role, 'USER')
+        
+        with self.assertRaisesMessage(CommandError, 'line 2: email: A user with that email already exists.'):
+            call_command('provision_users', path, stdout=out)
+
+
+class RecordingHasher(MD5PasswordHasher):
+    # Remembers the threads it verified passwords on
+    threads = []
+    
+    def verify(self, password, encoded):
+        self.threads.append(threading.current_thread().name)
+        return super().verify(password, encoded)
+
+
+class TokenObtainTests(TestCase):
+    """Test the token view and its password checks."""
+
+    def setUp(self):
+        TokenBucketThrottle.reset()
+        self.addCleanup(TokenBucketThrottle.reset)
+        passwords.reset()
+        self.addCleanup(passwords.reset)
+        self.client = APIClient()
+        self.url = reverse('token_obtain_pair')
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@example.com',
+            password='testpass123',
+            role='USER'
+        )
+
+    def test_obtain_token(self):
+        """Test that valid credentials return tokens that authenticate requests."""
+        res = self.client.post(self.url, {'email': 'user@example.com', 'password': 'testpass123'}, format='json')
+        
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('refresh', res.json())
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {res.json()['access']}")
+        self.assertEqual(self.client.get(reverse('user-detail')).json()['email'], 'user@example.com')
+
+    def test_obtain_token_fails(self):
+        """Test that wrong passwords, unknown and inactive accounts, and missing fields are rejected."""
+        res = self.client.post(self.url, {'email': 'user@example.com', 'password': 'wrong'})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res.json()['detail'], 'No active account found with the given credentials')
+        self.assertIn('WWW-Authenticate', res)
+        
+        res = self.client.post(self.url, {'email': 'nobody@example.com', 'password': 'testpass123'})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.post(self.url, {'email': 'user@example.com', 'password': 'testpass123'})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        
+        res = self.client.post(self.url, {'email': 'user@example.com'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('password', res.json())
+
+    def test_failed_login_sends_signal(self):
+        """Test that token requests go through authenticate(), which reports failed logins."""
+        failures = []
+        def receiver(credentials, **kwargs):
+            failures.append(credentials)
+        user_login_failed.connect(receiver)
+        self.addCleanup(user_login_failed.disconnect, receiver)
+        
+        res = self.client.post(self.url, {'email': 'user@example.com', 'password': 'wrong'})
+        
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(failures[0]['email'], 'user@example.com')
+
+    @override_settings(PASSWORD_HASHERS=['users.tests.RecordingHasher'])
+    def test_password_checked_once_on_the_pool(self):
+        """Test that the async token view awaits one check on the pool, which authenticate() reuses."""
+        self.assertTrue(iscoroutinefunction(resolve(self.url).func))
+        self.user.set_password('testpass123')
+        self.user.save()
+        RecordingHasher.threads = []
+        
+        res = self.client.post(self.url, {'email': 'user@example.com', 'password': 'testpass123'})
+        
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(RecordingHasher.threads), 1)
+        self.assertTrue(RecordingHasher.threads[0].startswith('password'))
+
+    @override_settings(PASSWORD_CHECK_QUEUE=1)
+    def test_busy_when_check_queue_is_full(self):
+        """Test that token requests are refused while the password check queue is full."""
+        _, slots = passwords.get_executor()
+        slots.acquire()
+        self.addCleanup(slots.release)
+        
+        res = self.client.post(self.url, {'email': 'user@example.com', 'password': 'testpass123'})
+        
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '1')
+        self.assertEqual(res.json()['detail'], 'Too many sign-ins in progress, try again shortly.')
+
+
+class RehashOnLoginTests(TestCase):
+    """Test upgrading outdated password hashes when users log in."""
+
+    def setUp(self):
+        TokenBucketThrottle.reset()
+        self.addCleanup(TokenBucketThrottle.reset)
+        passwords.reset()
+        self.addCleanup(passwords.reset)
+        with self.settings(PASSWORD_HASHERS=[OLD_HASHER]):
+            self.user = User.objects.create_user(
+                username='user',
+                email='user@example.com',
+                password='testpass123',
+                role='USER'
+            )
+        self.url = reverse('token_obtain_pair')
+        self.payload = {'email': 'user@example.com', 'password': 'testpass123'}
+
+    def stored_algorithm(self):
+        self.user.refresh_from_db()
+        return self.user.password.split('$', 1)[0]
+
+    @override_settings(PASSWORD_HASHERS=[NEW_HASHER, OLD_HASHER])
+    def test_login_upgrades_hash(self):
+        """Test that the token view stores a hash with the current hasher by default."""
+        res = APIClient().post(self.url, self.payload)
+        
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.stored_algorithm(), 'pbkdf2_sha256')
+        self.assertTrue(self.user.check_password('testpass123'))
+
+    @override_settings(PASSWORD_HASHERS=[NEW_HASHER, OLD_HASHER], PASSWORD_REHASH_ON_LOGIN=False)
+    def test_rehash_disabled(self):
+        """Test that outdated hashes are kept when rehashing on login is turned off."""
+        res = APIClient().post(self.url, self.payload)
+        
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.stored_algorithm(), 'md5')
+        self.assertTrue(self.user.check_password('testpass123'))
+        self.assertEqual(self.stored_algorithm(), 'md5')
@@ -1,13 +1,11 @@
 from django.urls import path
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-)
-from .views import RegisterView, UserDetailView
+from rest_framework_simplejwt.views import TokenRefreshView
+from .views import BulkRegisterView, RegisterView, TokenObtainView, UserDetailView
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
-    path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('bulk/', BulkRegisterView.as_view(), name='user-bulk-create'),
+    path('token/', TokenObtainView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('me/', UserDetailView.as_view(), name='user-detail'),
 ]
\ No newline at end of file
@@ -1,8 +1,16 @@
+from asgiref.sync import markcoroutinefunction, sync_to_async
 from rest_framework import generics, permissions
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.contrib.auth import get_user_model
-from .serializers import UserSerializer, UserCreateSerializer
+from django.conf import settings
+from django.contrib.auth import get_backends, get_user_model
+from rest_framework_simplejwt.views import TokenObtainPairView
+from api.permissions import IsAdminUser
+from backend.throttling import LoginAccountThrottle, LoginIPThrottle
+from . import passwords
+from .backends import PasswordPoolBackend
+from .serializers import BulkUserSerializer, UserSerializer, UserCreateSerializer
 
 User = get_user_model()
 
@@ -12,10 +20,75 @@ class RegisterView(generics.CreateAPIView):
     permission_classes = [permissions.AllowAny]
     serializer_class = UserCreateSerializer
 
+class BulkRegisterView(generics.CreateAPIView):
+    
+    queryset = User.objects.all()
+    permission_classes = [IsAdminUser]
+    serializer_class = BulkUserSerializer
+    
+    def get_serializer(self, *args, **kwargs):
+        # A list of users, created together once every row is valid
+        kwargs['many'] = True
+        kwargs['max_length'] = getattr(settings, 'USER_BULK_MAX', 500)
+        return super().get_serializer(*args, **kwargs)
+
+class TokenObtainView(TokenObtainPairView):
+    # simplejwt's view with per-address and per-account throttles, made async so that a
+    # sign-in waits for its password check on the shared pool without holding a thread.
+    # Throttles and authenticate() still run as usual, through sync_to_async, and
+    # PasswordPoolBackend answers from the check already done, or 503 while the pool is full.
+    
+    throttle_classes = [LoginIPThrottle, LoginAccountThrottle]
+    
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return markcoroutinefunction(super().as_view(**initkwargs))
+    
+    async def dispatch(self, request, *args, **kwargs):
+        # APIView.dispatch, awaiting the password check between the throttles and the handler
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        checks = passwords.checked.set({})
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            if handler == self.post:
+                await self.check_password(request)
+            response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        finally:
+            passwords.checked.reset(checks)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+    
+    async def check_password(self, request):
+        # Only PasswordPoolBackend reuses the result; other backends hash for themselves
+        if not any(isinstance(backend, PasswordPoolBackend) for backend in get_backends()):
+            return
+        try:
+            credentials = self.get_serializer().to_internal_value(request.data)
+        except ValidationError:
+            # Reported by the handler
+            return
+        try:
+            user = await sync_to_async(User._default_manager.get_by_natural_key)(
+                credentials[User.USERNAME_FIELD]
+            )
+        except User.DoesNotExist:
+            user = None
+        await passwords.acheck(credentials['password'], user.password if user else None)
+
 class UserDetailView(APIView):
     
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
         serializer = UserSerializer(request.user)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)